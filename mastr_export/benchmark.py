@@ -0,0 +1,79 @@
+from .parser import Parser
+from .spec import Spec, Specs
+from . import decoder
+
+import io
+import polars as pl
+import random
+import time
+
+# Share of optional fields that are left out of each synthetic record.
+MISSING_RATIO = 0.3
+
+XSD_TO_SAMPLE = {
+    "date": lambda r: f"20{r.randrange(10, 24)}-{r.randrange(1, 13):02d}-{r.randrange(1, 29):02d}",
+    "dateTime": lambda r: f"2023-{r.randrange(1, 13):02d}-{r.randrange(1, 29):02d}T{r.randrange(24):02d}:{r.randrange(60):02d}:{r.randrange(60):02d}.{r.randrange(10**7):07d}",
+    "float": lambda r: f"{r.uniform(0, 1000):.4f}",
+    "double": lambda r: f"{r.uniform(0, 1000):.6f}",
+    "decimal": lambda r: f"{r.uniform(0, 1000):.3f}",
+    "byte": lambda r: str(r.randrange(100)),
+    "short": lambda r: str(r.randrange(3000)),
+    "int": lambda r: str(r.randrange(100_000)),
+    "nonNegativeInteger": lambda r: str(r.randrange(10**9)),
+    "boolean": lambda r: str(r.randrange(2)),
+    "string": lambda r: f"SEE{r.randrange(10**12):012d}",
+}
+
+
+def synthesize(spec: Spec, records: int, seed=0) -> bytes:
+    """
+    Generate an export file for `spec` with `records` records of random values,
+    encoded as UTF-16 like the real export.
+    """
+    r = random.Random(seed)
+    parts = ['<?xml version="1.0" encoding="utf-16"?>', f"<{spec.root}>"]
+    for _ in range(records):
+        parts.append(f"<{spec.element}>")
+        for field in spec.fields.values():
+            if field.name != spec.primary and r.random() < MISSING_RATIO:
+                continue
+            parts.append(f"<{field.name}>{XSD_TO_SAMPLE[field.xsd](r)}</{field.name}>")
+        parts.append(f"</{spec.element}>")
+    parts.append(f"</{spec.root}>")
+    return "".join(parts).encode("utf-16")
+
+
+def _best_of(repeat, action) -> tuple[float, pl.DataFrame]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = action()
+        best = min(best, time.perf_counter() - start)
+    return best, df
+
+
+def benchmark(specs: Specs, records: int, repeat: int):
+    """
+    Compare the generic `Parser` with the compiled decoder for every spec, on the
+    same synthetic input, and check that both produce the same DataFrame.
+    """
+    print(f"{'Spec':<50} {'generic':>9} {'compiled':>9} {'speedup':>8}")
+    for spec in specs:
+        data = synthesize(spec, records)
+        schema = spec.polars_schema()
+        decode = decoder.for_spec(spec)
+        generic, expected = _best_of(
+            repeat,
+            lambda: pl.DataFrame(
+                Parser(spec).parse(io.BytesIO(data), spec.root), schema=schema
+            ),
+        )
+        compiled, actual = _best_of(
+            repeat,
+            lambda: pl.DataFrame(decode(io.BytesIO(data), spec.root), schema=schema),
+        )
+        if not expected.equals(actual):
+            raise Exception(f"{spec.element}: Compiled decoder differs from Parser")
+        print(
+            f"{spec.element:<50} {generic:>8.3f}s {compiled:>8.3f}s {generic / compiled:>7.2f}x"
+        )
@@ -1,17 +1,21 @@
-import sqlite3
-from typing import Iterator
+from typing import Iterator, Optional
 from .spec import Spec, Specs
-from .parser import Parser
 
+from . import benchmark
 from . import download
+from . import duckdb_export
+from . import schedule
+from . import shard
+from . import stats
 from . import spec_data
 from . import static_data
+from . import targets
 from . import xsd_parser
+from . import zipstream
 
 import argparse
-import datetime
-import duckdb
 import importlib.resources
+import os
 import polars as pl
 import time
 from tqdm.auto import tqdm
@@ -19,6 +23,13 @@ from tqdm.utils import CallbackIOWrapper
 import zipfile
 
 
+def positive_int(s: str) -> int:
+    n = int(s)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"Expected a positive number, got {s}")
+    return n
+
+
 def cli():
     parser = argparse.ArgumentParser(prog="mastr-export")
     subparsers = parser.add_subparsers(required=True)
@@ -34,6 +45,30 @@ def cli():
     )
     parse_xsd.set_defaults(func=lambda args: parse_xsd_from_docs(args.spec))
 
+    benchmark_decoders = subparsers.add_parser("benchmark-decoders")
+    benchmark_decoders.add_argument(
+        "--spec",
+        default=(importlib.resources.files(spec_data) / "Gesamtdatenexport.yaml"),
+        help="(input) path to the YAML file containing the list of specs",
+    )
+    benchmark_decoders.add_argument(
+        "--records",
+        default=10_000,
+        type=int,
+        help="number of synthetic records per spec",
+    )
+    benchmark_decoders.add_argument(
+        "--repeat",
+        default=3,
+        type=int,
+        help="number of runs per spec and decoder; the fastest one counts",
+    )
+    benchmark_decoders.set_defaults(
+        func=lambda args: benchmark.benchmark(
+            Specs.load(args.spec), args.records, args.repeat
+        )
+    )
+
     duckdb_extract = subparsers.add_parser("extract-to-duckdb")
     duckdb_extract.add_argument(
         "--export",
@@ -61,6 +96,12 @@ def cli():
         action="store_true",
         help="show a progress bar for each individual file?",
     )
+    duckdb_extract.add_argument(
+        "--stream",
+        default=False,
+        action="store_true",
+        help="parse the export while it is being downloaded? EXPORT may then also be an HTTP(S) URL",
+    )
     duckdb_extract.set_defaults(
         func=lambda args: extract_to_duckdb(
             args.spec,
@@ -68,6 +109,7 @@ def cli():
             args.census,
             args.duckdb,
             args.show_per_file_progress,
+            args.stream,
         )
     )
 
@@ -93,12 +135,210 @@ def cli():
         action="store_true",
         help="show a progress bar for each individual file?",
     )
+    sqlite_extract.add_argument(
+        "--stream",
+        default=False,
+        action="store_true",
+        help="parse the export while it is being downloaded? EXPORT may then also be an HTTP(S) URL",
+    )
     sqlite_extract.set_defaults(
         func=lambda args: extract_to_sqlite(
             args.spec,
             args.export,
             args.sqlite,
             args.show_per_file_progress,
+            args.stream,
+        )
+    )
+
+    multi_extract = subparsers.add_parser("extract")
+    multi_extract.add_argument(
+        "--export",
+        required=True,
+        help="(input) path to the Marktstammdatenregister export ZIP file",
+    )
+    multi_extract.add_argument(
+        "--spec",
+        default=(importlib.resources.files(spec_data) / "Gesamtdatenexport.yaml"),
+        help="(input) path to the YAML file containing the list of specs",
+    )
+    multi_extract.add_argument(
+        "--census",
+        default=(importlib.resources.files(static_data) / "zensus2022.parquet"),
+        help="(input) path to the Parquet file containing census data. Set to empty to skip copying census data into the targets",
+    )
+    multi_extract.add_argument(
+        "--to",
+        default=[],
+        action="append",
+        type=targets.parse_target,
+        metavar="KIND:PATH",
+        help="(output) duckdb:FILE, sqlite:FILE, parquet:DIR or csv:DIR. May be given multiple times",
+    )
+    multi_extract.add_argument(
+        "--buffer-size",
+        default=targets.BUFFER_SIZE,
+        type=positive_int,
+        help="number of parsed files each target may fall behind before parsing waits for it",
+    )
+    multi_extract.add_argument(
+        "--show-per-file-progress",
+        default=False,
+        action="store_true",
+        help="show a progress bar for each individual file?",
+    )
+    multi_extract.add_argument(
+        "--stream",
+        default=False,
+        action="store_true",
+        help="parse the export while it is being downloaded? EXPORT may then also be an HTTP(S) URL",
+    )
+    multi_extract.add_argument(
+        "--manifest",
+        help="(input) work manifest written by `plan`, required with --shard",
+    )
+    multi_extract.add_argument(
+        "--shard",
+        type=shard.parse_shard,
+        metavar="INDEX/COUNT",
+        help="only extract the work units assigned to shard INDEX of COUNT (counting from 0) into Parquet files below --shard-dir, instead of writing to --to targets",
+    )
+    multi_extract.add_argument(
+        "--shard-dir",
+        help="(output) directory for the per-shard Parquet files, required with --shard",
+    )
+    multi_extract.add_argument(
+        "--jobs",
+        default=1,
+        type=int,
+        help="number of processes parsing files in parallel, largest files first. Not supported with --stream",
+    )
+    multi_extract.add_argument(
+        "--throughput-history",
+        help="(input/output) JSON file with the parsing throughput per spec measured in earlier runs, used to schedule files",
+    )
+    multi_extract.add_argument(
+        "--report",
+        help="(output) JSON file with predicted and actual parsing times",
+    )
+    multi_extract.add_argument(
+        "--no-column-stats",
+        dest="column_stats",
+        default=True,
+        action="store_false",
+        help="do not gather column statistics into the _column_stats table",
+    )
+    multi_extract.add_argument(
+        "--flag-wide-types",
+        default=False,
+        action="store_true",
+        help="list integer columns whose declared type is wider than the observed values",
+    )
+    multi_extract.set_defaults(
+        func=lambda args: extract_to_targets(
+            args.spec,
+            args.export,
+            args.census,
+            args.to,
+            args.buffer_size,
+            args.show_per_file_progress,
+            args.stream,
+            args.manifest,
+            args.shard,
+            args.shard_dir,
+            args.jobs,
+            args.throughput_history,
+            args.report,
+            args.column_stats,
+            args.flag_wide_types,
+        )
+    )
+
+    plan = subparsers.add_parser("plan")
+    plan.add_argument(
+        "--export",
+        required=True,
+        help="(input) path to the Marktstammdatenregister export ZIP file",
+    )
+    plan.add_argument(
+        "--spec",
+        default=(importlib.resources.files(spec_data) / "Gesamtdatenexport.yaml"),
+        help="(input) path to the YAML file containing the list of specs",
+    )
+    plan.add_argument(
+        "--manifest",
+        required=True,
+        help="(output) work manifest JSON file path",
+    )
+    plan.set_defaults(
+        func=lambda args: shard.save_manifest(
+            shard.plan(Specs.load(args.spec), args.export), args.manifest
+        )
+    )
+
+    merge = subparsers.add_parser("merge")
+    merge.add_argument(
+        "--manifest",
+        required=True,
+        help="(input) work manifest written by `plan`",
+    )
+    merge.add_argument(
+        "--shard-dir",
+        required=True,
+        help="(input) directory containing the outputs of all `extract --shard` runs",
+    )
+    merge.add_argument(
+        "--spec",
+        default=(importlib.resources.files(spec_data) / "Gesamtdatenexport.yaml"),
+        help="(input) path to the YAML file containing the list of specs",
+    )
+    merge.add_argument(
+        "--census",
+        default=(importlib.resources.files(static_data) / "zensus2022.parquet"),
+        help="(input) path to the Parquet file containing census data. Set to empty to skip copying census data into the targets",
+    )
+    merge.add_argument(
+        "--to",
+        required=True,
+        action="append",
+        type=targets.parse_target,
+        metavar="KIND:PATH",
+        help="(output) duckdb:FILE, sqlite:FILE, parquet:DIR or csv:DIR. May be given multiple times",
+    )
+    merge.add_argument(
+        "--buffer-size",
+        default=targets.BUFFER_SIZE,
+        type=positive_int,
+        help="number of work units each target may fall behind before reading waits for it",
+    )
+    merge.add_argument(
+        "--report",
+        help="(output) JSON file with the column statistics",
+    )
+    merge.add_argument(
+        "--no-column-stats",
+        dest="column_stats",
+        default=True,
+        action="store_false",
+        help="do not gather column statistics into the _column_stats table",
+    )
+    merge.add_argument(
+        "--flag-wide-types",
+        default=False,
+        action="store_true",
+        help="list integer columns whose declared type is wider than the observed values",
+    )
+    merge.set_defaults(
+        func=lambda args: merge_shards(
+            args.spec,
+            args.manifest,
+            args.shard_dir,
+            args.census,
+            args.to,
+            args.buffer_size,
+            args.report,
+            args.column_stats,
+            args.flag_wide_types,
         )
     )
 
@@ -120,12 +360,53 @@ def cli():
         "--parquet-dir",
         help="Parquet directory",
     )
+    export.add_argument(
+        "--jobs",
+        default=4,
+        type=int,
+        help="number of tables exported in parallel",
+    )
+    export.add_argument(
+        "--compression",
+        choices=["none", "gzip", "zstd"],
+        help="compression codec for CSV and Parquet files (default: none for CSV, snappy for Parquet)",
+    )
+    export.add_argument(
+        "--max-rows-per-file",
+        type=positive_int,
+        help="split tables into files of at most this many rows",
+    )
+    export.add_argument(
+        "--max-file-size",
+        type=positive_int,
+        help="split tables into files of roughly this many bytes",
+    )
+    export.add_argument(
+        "--row-group-size",
+        type=positive_int,
+        help="maximum number of rows per Parquet row group",
+    )
+    export.add_argument(
+        "--no-dictionary",
+        dest="dictionary",
+        default=True,
+        action="store_false",
+        help="disable dictionary encoding in Parquet files",
+    )
     export.set_defaults(
         func=lambda args: export_from_duckdb(
             args.duckdb,
             args.sqlite,
             args.csv_dir,
             args.parquet_dir,
+            args.jobs,
+            duckdb_export.Options(
+                args.compression,
+                args.max_rows_per_file,
+                args.max_file_size,
+                args.row_group_size,
+                args.dictionary,
+            ),
         )
     )
 
@@ -133,142 +414,328 @@ def cli():
     args.func(args)
 
 
-def print_runtime(message, action, arg):
-    print(message, end=" ", flush=True)
-    start_ns = time.perf_counter_ns()
-    action(arg)
-    delta_ns = time.perf_counter_ns() - start_ns
-    delta = datetime.timedelta(microseconds=delta_ns // 1_000)
-    print(f"took {str(delta)}")
+def parse_member(
+    d: Spec, f, i: zipfile.ZipInfo, show_per_file_progress, progress
+) -> pl.DataFrame:
+    with tqdm(
+        total=(i.file_size or None),
+        desc=i.filename,
+        unit="B",
+        unit_scale=True,
+        unit_divisor=1024,
+        leave=False,
+        disable=(not show_per_file_progress),
+    ) as xml_progress:
+        if not show_per_file_progress:
+            progress.set_description(i.filename)
+
+        def update(n):
+            xml_progress.update(n)
+            progress.update(n)
+
+        f = CallbackIOWrapper(update, f)
+        return schedule.parse(d, f, i.filename)
+
+
+def bytes_progress(total=None):
+    return tqdm(
+        total=total, desc="Extracting", unit="B", unit_scale=True, unit_divisor=1024
+    )
 
 
 def extract(
-    specs: Specs, export, show_per_file_progress
+    specs: Specs,
+    export,
+    show_per_file_progress,
+    stream=False,
+    members: Optional[set[str]] = None,
+    jobs=1,
+    throughput: Optional[schedule.Throughput] = None,
+    report: Optional[schedule.Report] = None,
 ) -> Iterator[tuple[str, Spec, pl.DataFrame]]:
-    with zipfile.ZipFile(export) as z:
-        # Sanity check: do we know how to handle all the files in the export?
-        spec_to_xml_files: dict[str, list[zipfile.ZipInfo]] = {}
-        for i in z.infolist():
-            d = specs.for_file(i.filename)
-            if not i.filename.endswith(".xml"):
-                raise Exception(f"Expected only XML files, got {i.filename}")
-            spec_to_xml_files[d.element] = spec_to_xml_files.get(d.element, []) + [i]
+    """
+    Convert the XML files in `export` (only those named in `members`, if given).
+
+    With more than one job, files are parsed in a process pool, largest first;
+    they are still yielded in the order of their specs.
+    """
+    throughput = throughput if throughput is not None else schedule.Throughput()
+    report = report if report is not None else schedule.Report(jobs, 0.0)
+    start = time.perf_counter()
+    if stream:
+        # Files are parsed as they arrive, so there is nothing to predict.
+        report.predicted_wall_time = None
+        yield from extract_stream(
+            specs, export, show_per_file_progress, members, throughput, report
+        )
+        report.actual_wall_time = time.perf_counter() - start
+        return
 
-        # Assemble the list of files in the order of their specs.
-        xml_files: list[tuple[zipfile.ZipInfo, Spec]] = []
-        for d in specs:
-            for i in spec_to_xml_files[d.element]:
-                xml_files.append((i, d))
+    with zipfile.ZipFile(export) as z:
+        xml_files = [
+            (i, d)
+            for i, d in specs.in_load_order(z.infolist())
+            if members is None or i.filename in members
+        ]
 
         # Convert XML to DataFrames
-        xml_files_progress = tqdm(xml_files, desc="Files")
-        for i, d in xml_files_progress:
-            with tqdm(
-                total=i.file_size,
-                desc=i.filename,
-                unit="B",
-                unit_scale=True,
-                unit_divisor=1024,
-                leave=False,
-                disable=(not show_per_file_progress),
-            ) as xml_progress:
-                if not show_per_file_progress:
-                    xml_files_progress.set_description(i.filename)
+        progress = bytes_progress(sum(i.file_size for i, _ in xml_files))
+        if jobs > 1:
+            for i, d, df in schedule.execute(
+                export, xml_files, jobs, throughput, report, progress
+            ):
+                yield i.filename, d, df
+        else:
+            report.predicted_wall_time = sum(
+                throughput.estimate(d, i.file_size) for i, d in xml_files
+            )
+            for i, d in xml_files:
+                member_start = time.perf_counter()
                 with z.open(i) as f:
-                    f = CallbackIOWrapper(xml_progress.update, f)
-                    data = Parser(d).parse(f, i.filename)
-
-            df = pl.DataFrame(
-                data=data,
-                schema=dict(
-                    (name, field.polars_type) for name, field in d.fields.items()
-                ),
+                    df = parse_member(d, f, i, show_per_file_progress, progress)
+                report.add(
+                    d,
+                    i.file_size,
+                    throughput.estimate(d, i.file_size),
+                    time.perf_counter() - member_start,
+                )
+                yield i.filename, d, df
+        progress.close()
+    report.actual_wall_time = time.perf_counter() - start
+
+
+def extract_stream(
+    specs: Specs,
+    export,
+    show_per_file_progress,
+    members: Optional[set[str]],
+    throughput: schedule.Throughput,
+    report: schedule.Report,
+) -> Iterator[tuple[str, Spec, pl.DataFrame]]:
+    # Files are converted in the order in which they are stored in the export, not
+    # in the order of their specs. Files belonging to the same spec keep their
+    # relative order, so primary key conflicts are resolved as in `extract`.
+    with zipstream.open_export(export) as source:
+        progress = bytes_progress()
+        for i, f in zipstream.iter_members(source):
+            d = specs.for_file(i.filename)
+            if not i.filename.endswith(".xml"):
+                raise Exception(f"Expected only XML files, got {i.filename}")
+            if members is not None and i.filename not in members:
+                continue
+            member_start = time.perf_counter()
+            df = parse_member(d, f, i, show_per_file_progress, progress)
+            # Sizes are only known up front if the member has no data descriptor.
+            report.add(
+                d,
+                i.file_size,
+                throughput.estimate(d, i.file_size),
+                time.perf_counter() - member_start,
             )
             yield i.filename, d, df
-
-
-def extract_to_duckdb(spec, export, census, duckdb_file, show_per_file_progress):
+        progress.close()
+
+
+def extract_to_targets(
+    spec,
+    export,
+    census,
+    to,
+    buffer_size,
+    show_per_file_progress,
+    stream=False,
+    manifest_file=None,
+    shard_index_count=None,
+    shard_directory=None,
+    jobs=1,
+    throughput_history=None,
+    report_file=None,
+    column_stats=True,
+    flag_wide_types=False,
+):
+    if stream and jobs > 1:
+        raise Exception(
+            "--stream parses files one at a time as they are read, do not pass --jobs"
+        )
     specs = Specs.load(spec)
-    with duckdb.connect(duckdb_file) as duckdb_con:
-        for spec in specs.specs:
-            duckdb_con.sql(spec.duckdb_schema())
-
-    for f, d, df in extract(specs, export, show_per_file_progress):
-        with duckdb.connect(duckdb_file) as duckdb_con:
-            try:
-                if d.primary is None:
-                    duckdb_con.sql(f"""INSERT INTO "{d.element}" SELECT * FROM df""")
-                else:
-                    duckdb_con.sql(
-                        f"""INSERT OR IGNORE INTO "{d.element}" SELECT * FROM df"""
-                    )
-            except duckdb.ConstraintException as e:
-                e.add_note(f"File: {f}")
-                e.add_note(str(df))
-                raise
-
-    if census != "":
-        with duckdb.connect(duckdb_file) as duckdb_con:
-            duckdb_con.sql(
-                "CREATE TABLE Zensus2022 (AGS TEXT PRIMARY KEY, Gemeinde TEXT NOT NULL, AnzahlPersonen UINTEGER NOT NULL)"
+    members = None
+    if shard_index_count is not None:
+        if manifest_file is None or shard_directory is None:
+            raise Exception("--shard requires --manifest and --shard-dir")
+        if to:
+            raise Exception("--shard writes to --shard-dir, do not pass --to")
+        manifest = shard.load_manifest(manifest_file)
+        if not stream and os.path.getsize(export) != manifest["export_size"]:
+            raise Exception(
+                f"{export} is not the export the manifest was planned for ({manifest['export']})"
+            )
+        index, count = shard_index_count
+        units = shard.assign(manifest["units"], count)[index]
+        members = set(unit["member"] for unit in units)
+        to = [
+            shard.ShardTarget(
+                shard.shard_dir(shard_directory, index, count),
+                units,
+                shard.identity(manifest, index, count),
             )
-            duckdb_con.sql(f"INSERT INTO Zensus2022 (SELECT * FROM '{census}')")
+        ]
+        # The census and column statistics are added by `merge`.
+        census = ""
+        column_stats = False
+    elif not to:
+        raise Exception("Pass at least one --to target, or --shard")
+
+    throughput = schedule.Throughput(throughput_history)
+    report = schedule.Report(jobs, 0.0)
+    batches = extract(
+        specs,
+        export,
+        show_per_file_progress,
+        stream,
+        members,
+        jobs,
+        throughput,
+        report,
+    )
+    statistics = stats.Statistics(specs) if column_stats else None
+    targets.fan_out(
+        to,
+        specs,
+        statistics.observe(batches) if statistics is not None else batches,
+        census=(str(census) if census != "" else None),
+        buffer_size=buffer_size,
+        tables=(
+            (lambda: column_stats_tables(statistics, report))
+            if statistics is not None
+            else None
+        ),
+    )
+    print(report.summary())
+    if statistics is not None and flag_wide_types:
+        print_wide_types(statistics)
+    if not stream:
+        # Streamed members are timed while they are still being read, so the
+        # measurements include waiting for the input.
+        throughput.update(report.throughput())
+        throughput.save()
+    if report_file is not None:
+        report.save(report_file)
+
+
+def merge_shards(
+    spec,
+    manifest_file,
+    shard_directory,
+    census,
+    to,
+    buffer_size,
+    report_file=None,
+    column_stats=True,
+    flag_wide_types=False,
+):
+    specs = Specs.load(spec)
+    manifest = shard.load_manifest(manifest_file)
+    # Nothing is parsed, so the report only carries the column statistics.
+    report = schedule.Report(None, None)
+    batches = tqdm(
+        shard.read_shards(specs, manifest, shard_directory),
+        desc="Units",
+        total=len(manifest["units"]),
+    )
+    statistics = stats.Statistics(specs) if column_stats else None
+    targets.fan_out(
+        to,
+        specs,
+        statistics.observe(batches) if statistics is not None else batches,
+        census=(str(census) if census != "" else None),
+        buffer_size=buffer_size,
+        tables=(
+            (lambda: column_stats_tables(statistics, report))
+            if statistics is not None
+            else None
+        ),
+    )
+    if statistics is not None and flag_wide_types:
+        print_wide_types(statistics)
+    if report_file is not None:
+        report.save(report_file)
+
+
+def column_stats_tables(
+    statistics: stats.Statistics, report: Optional[schedule.Report] = None
+) -> dict[str, pl.DataFrame]:
+    df = statistics.to_dataframe()
+    if report is not None:
+        report.column_stats = df.to_dicts()
+    return {stats.TABLE: df}
+
+
+def print_wide_types(statistics: stats.Statistics):
+    columns = statistics.wider_than_observed()
+    if not columns:
+        return
+    print("Columns whose declared type is wider than the observed values:")
+    for c in columns:
+        print(
+            f"  {c.table}.{c.column}: {c.xsd} could be {c.narrowest_xsd()} ({c.min} to {c.max})"
+        )
+
 
-    with duckdb.connect(duckdb_file) as duckdb_con:
-        duckdb_con.sql("VACUUM ANALYZE")
+def extract_to_duckdb(
+    spec, export, census, duckdb_file, show_per_file_progress, stream=False
+):
+    extract_to_targets(
+        spec,
+        export,
+        census,
+        [targets.DuckDBTarget(duckdb_file)],
+        targets.BUFFER_SIZE,
+        show_per_file_progress,
+        stream,
+        # The single-target commands have always written only the export.
+        column_stats=False,
+    )
 
 
-def extract_to_sqlite(spec, export, sqlite_file, show_per_file_progress):
-    con = sqlite3.connect(sqlite_file)
-    specs = Specs.load(spec)
-    with con:
-        for spec in specs.specs:
-            con.execute(spec.sqlite_schema())
-
-    for f, d, df in extract(specs, export, show_per_file_progress):
-        with con:
-            columns = ", ".join(f"'{name}'" for name in df.columns)
-            values = ", ".join("?" for _ in range(len(df.columns)))
-            stmt = f"""INSERT INTO "{d.element}" ({columns}) VALUES ({values})"""
-            if d.primary is not None:
-                stmt += " ON CONFLICT DO NOTHING"
-            try:
-                con.executemany(stmt, df.iter_rows())
-            except sqlite3.IntegrityError as e:
-                e.add_note(f"File: %{f}")
-                raise
-
-    with con:
-        con.execute("ANALYZE")
-        con.execute("VACUUM")
-
-
-def export_from_duckdb(duckdb_file, sqlite_file, csv_dir, parquet_dir):
+def extract_to_sqlite(spec, export, sqlite_file, show_per_file_progress, stream=False):
+    extract_to_targets(
+        spec,
+        export,
+        "",
+        [targets.SQLiteTarget(sqlite_file)],
+        targets.BUFFER_SIZE,
+        show_per_file_progress,
+        stream,
+        # The single-target commands have always written only the export.
+        column_stats=False,
+    )
+
+
+def export_from_duckdb(
+    duckdb_file, sqlite_file, csv_dir, parquet_dir, jobs=1, options=None
+):
+    options = options if options is not None else duckdb_export.Options()
     if csv_dir is not None:
-        with duckdb.connect(duckdb_file, read_only=True) as duckdb_con:
-            print_runtime(
-                f"Exporting CSV files to {csv_dir} ...",
-                action=duckdb_con.sql,
-                arg=f"""export database '{csv_dir}' (format csv)""",
-            )
+        start = time.perf_counter()
+        all_stats = duckdb_export.export_files(
+            duckdb_file, csv_dir, "csv", options, jobs
+        )
+        duckdb_export.print_total(f"Exported CSV files to {csv_dir}", all_stats, start)
 
     if parquet_dir is not None:
-        with duckdb.connect(duckdb_file, read_only=True) as duckdb_con:
-            print_runtime(
-                f"Exporting Parquet files to {parquet_dir} ...",
-                action=duckdb_con.sql,
-                arg=f"""export database '{parquet_dir}' (format parquet)""",
-            )
+        start = time.perf_counter()
+        all_stats = duckdb_export.export_files(
+            duckdb_file, parquet_dir, "parquet", options, jobs
+        )
+        duckdb_export.print_total(
+            f"Exported Parquet files to {parquet_dir}", all_stats, start
+        )
 
     if sqlite_file is not None:
-        print_runtime(
-            f"Exporting SQLite database to {sqlite_file} ...",
-            action=duckdb.sql,
-            arg=f"""
-attach '{duckdb_file}' as source (read_only);
-attach '{sqlite_file}' as target (type sqlite);
-copy from database source to target;
-""",
+        start = time.perf_counter()
+        all_stats = duckdb_export.export_sqlite(duckdb_file, sqlite_file)
+        duckdb_export.print_total(
+            f"Exported SQLite database to {sqlite_file}", all_stats, start
         )
 
 
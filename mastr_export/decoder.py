@@ -0,0 +1,281 @@
+from .parser import START_ELEMENT, END_ELEMENT, CDATA
+from .spec import Spec, XSD_TO_PYTHON
+
+from array import array
+import hashlib
+import json
+import os
+import polars as pl
+import tempfile
+from typing import Callable, Optional
+
+# Bump whenever the generated code changes, so that cached decoders are rebuilt.
+GENERATOR_VERSION = 3
+
+
+# Strings that Polars converts in the same way as `spec.XSD_TO_PYTHON`. Columns
+# with any other value are converted value by value in Python instead.
+INTEGER = r"^[+-]?[0-9]+$"
+FLOAT = r"^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$"
+DATE = r"^[0-9]{4}-[0-9]{2}-[0-9]{2}$"
+# Polars also accepts a leap second (:60), which `datetime` rejects.
+DATETIME = r"^[0-9]{4}-[0-9]{2}-[0-9]{2}T([01][0-9]|2[0-3]):[0-5][0-9]:[0-5][0-9](\.[0-9]{1,9})?$"
+
+
+def _convert(s: pl.Series, xsd, dtype: pl.DataType) -> Optional[pl.Series]:
+    try:
+        if xsd in ("byte", "short", "int", "nonNegativeInteger"):
+            if s.str.contains(INTEGER).all():
+                return s.cast(dtype)
+        elif xsd in ("float", "double", "decimal"):
+            if s.str.contains(FLOAT).all():
+                return s.cast(pl.Float64).cast(dtype)
+        elif xsd == "date":
+            if s.str.contains(DATE).all():
+                return s.str.to_date("%Y-%m-%d")
+        elif xsd == "dateTime":
+            if s.str.contains(DATETIME).all():
+                return s.str.to_datetime("%Y-%m-%dT%H:%M:%S%.f", time_unit="us")
+        elif xsd == "boolean":
+            # `bool` is true for any non-empty string, and missing values stay null.
+            return s.str.len_bytes() >= 0
+        else:
+            return s
+    except pl.exceptions.PolarsError:
+        pass
+    return None
+
+
+def converter(xsd):
+    # Like `Field.convert`.
+    python_type = XSD_TO_PYTHON[xsd]
+    return lambda s: python_type(s) if s is not None else None
+
+
+def column(
+    name: str, n: int, indices: array, values: list, xsd, dtype: pl.DataType
+) -> pl.Series:
+    """
+    Build the column `name` of `n` rows from the string `values` of the rows in
+    `indices`. The name shows up in errors, as it does with `Parser`.
+    """
+    s = _convert(pl.Series(name, values, dtype=pl.Utf8), xsd, dtype)
+    if s is None:
+        convert = converter(xsd)
+        s = pl.Series(name, [convert(value) for value in values], dtype=dtype)
+    if len(indices) == n:
+        # Every row has a value, so `indices` is `range(n)`.
+        return s
+    return pl.repeat(None, n, dtype=dtype, eager=True).scatter(pl.Series(indices), s)
+
+
+def repeated(values: list, convert, text):
+    """
+    Add `text` of a field that occurs a second time in the same record, failing
+    like the generic parser for everything but strings.
+    """
+    current = convert(values[-1])
+    if text is None:
+        convert(current)
+    else:
+        values[-1] = ("" if current is None else current) + text
+
+
+def generate(spec: Spec) -> str:
+    """
+    Generate the source of a module with a `decode(f, filename)` function for
+    `spec`. It accepts the same documents as `Parser(spec).parse` and fails with
+    the same messages, but returns the columns as Polars Series.
+
+    Values are collected as strings and converted one column at a time after the
+    whole document has been read, so the error for an invalid value may refer to
+    a different value than the generic parser's if there are several.
+    """
+    fields = list(spec.fields.values())
+    columns = "".join(
+        f"""        {field.name!r}: column({field.name!r}, n, IDX[{n}], VAL[{n}], {field.xsd!r}, DTYPES[{n}]),
+"""
+        for n, field in enumerate(fields)
+    )
+    slots = ", ".join(f"{field.name!r}: {n}" for n, field in enumerate(fields))
+    names = ", ".join(repr(field.name) for field in fields)
+    xsds = [field.xsd for field in fields]
+
+    return f"""# Generated by mastr_export.decoder for {spec.element}. Do not edit.
+from array import array
+import xml.parsers.expat as sax
+
+from mastr_export.decoder import column, converter, repeated
+from mastr_export.spec import XSD_TO_POLARS
+
+ROOT = {spec.root!r}
+ELEMENT = {spec.element!r}
+SLOTS = {{{slots}}}
+KEYS = dict.fromkeys([{names}]).keys()
+DTYPES = [XSD_TO_POLARS[xsd] for xsd in {xsds!r}]
+CONVERT = [converter(xsd) for xsd in {xsds!r}]
+
+# States, named after the methods of the generic parser.
+START_ROOT = 0
+START_ELEMENT_OR_END_ROOT = 1
+START_ATTR_OR_END_ELEMENT = 2
+ATTR_CDATA_OR_END_ATTR = 3
+DONE = 4
+
+
+def decode(f, filename):
+    state = START_ROOT
+    row = -1
+    current = None
+    slot = 0
+    text = None
+    # Row numbers and string values, per field.
+    IDX = [array("q") for _ in range({len(fields)})]
+    VAL = [[] for _ in range({len(fields)})]
+
+    def unexpected(event, data):
+        raise Exception(
+            f"{{filename}}: Did not expect further events, but got {{event}} for {{data}} in {{ROOT}}"
+        )
+
+    def start(name, _attrs):
+        nonlocal state, row, current, slot, text
+        if state == START_ATTR_OR_END_ELEMENT:
+            slot = SLOTS.get(name, -1)
+            if slot < 0:
+                raise Exception(f"{{filename}}: Element {{name}} not in {{KEYS}}")
+            current = name
+            text = None
+            state = ATTR_CDATA_OR_END_ATTR
+        elif state == START_ELEMENT_OR_END_ROOT:
+            if name != ELEMENT:
+                raise Exception(
+                    f"{{filename}}: Expected START_ELEMENT for {{ELEMENT}}, got {{name}}"
+                )
+            row += 1
+            state = START_ATTR_OR_END_ELEMENT
+        elif state == START_ROOT:
+            if name != ROOT:
+                raise Exception(
+                    f"{{filename}}: Expected START_ELEMENT for {{ROOT}}, got {{name}}"
+                )
+            state = START_ELEMENT_OR_END_ROOT
+        elif state == ATTR_CDATA_OR_END_ATTR:
+            raise Exception(
+                f"{{filename}}: Expected END_ELEMENT for {{current}}, got {START_ELEMENT} for {{name}}"
+            )
+        else:
+            unexpected({START_ELEMENT}, name)
+
+    def end(name):
+        nonlocal state, current
+        if state == ATTR_CDATA_OR_END_ATTR:
+            if name != current:
+                raise Exception(
+                    f"{{filename}}: Expected END_ELEMENT for {{current}}, got {{name}}"
+                )
+            indices = IDX[slot]
+            if indices and indices[-1] == row:
+                repeated(VAL[slot], CONVERT[slot], text)
+            else:
+                indices.append(row)
+                VAL[slot].append(text)
+            current = None
+            state = START_ATTR_OR_END_ELEMENT
+        elif state == START_ATTR_OR_END_ELEMENT:
+            if name != ELEMENT:
+                raise Exception(
+                    f"{{filename}}: Expected END_ELEMENT for {{ELEMENT}}, got {{name}}"
+                )
+            state = START_ELEMENT_OR_END_ROOT
+        elif state == START_ELEMENT_OR_END_ROOT:
+            if name != ROOT:
+                raise Exception(
+                    f"{{filename}}: Expected END_ELEMENT for {{ROOT}}, got {{name}}"
+                )
+            state = DONE
+        elif state == START_ROOT:
+            raise Exception(
+                f"{{filename}}: Expected START_ELEMENT for {{ROOT}}, got {END_ELEMENT}"
+            )
+        else:
+            unexpected({END_ELEMENT}, name)
+
+    def cdata(data):
+        nonlocal text
+        if state == ATTR_CDATA_OR_END_ATTR:
+            text = data if text is None else text + data
+        elif state == START_ATTR_OR_END_ELEMENT:
+            raise Exception(f"{{filename}}: Got {CDATA} for {{data}}")
+        elif state == START_ELEMENT_OR_END_ROOT:
+            raise Exception(f"{{filename}}: Expected START_ELEMENT, got {CDATA}")
+        elif state == START_ROOT:
+            raise Exception(
+                f"{{filename}}: Expected START_ELEMENT for {{ROOT}}, got {CDATA}"
+            )
+        else:
+            unexpected({CDATA}, data)
+
+    p = sax.ParserCreate()
+    p.StartElementHandler = start
+    p.EndElementHandler = end
+    p.CharacterDataHandler = cdata
+    p.ParseFile(f)
+
+    n = row + 1
+    return {{
+{columns}    }}
+"""
+
+
+def _cache_key(spec: Spec) -> str:
+    data = json.dumps([GENERATOR_VERSION, spec.to_object()], sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
+
+def default_cache_dir() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "mastr-export", "decoders")
+
+
+_decoders: dict[str, Callable] = {}
+
+
+def for_spec(spec: Spec, cache_dir: Optional[str] = None) -> Callable:
+    """
+    Return the compiled `decode(f, filename)` function for `spec`.
+
+    The generated source is cached in `cache_dir` (by default in the user's cache
+    directory) if it is writable, which also lets tracebacks show the generated
+    code.
+    """
+    key = _cache_key(spec)
+    decode = _decoders.get(key)
+    if decode is not None:
+        return decode
+
+    cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+    path = os.path.join(cache_dir, f"{spec.root}_{key}.py")
+    if os.path.exists(path):
+        with open(path) as f:
+            source = f.read()
+    else:
+        source = generate(spec)
+        tmp = None
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Parallel jobs may generate the same decoder at the same time: each
+            # writes its own file, and replacing the cached one is atomic.
+            fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                f.write(source)
+            os.replace(tmp, path)
+        except OSError:
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+            path = f"<decoder for {spec.element}>"
+
+    namespace = {"__name__": f"mastr_export.decoders.{spec.root}"}
+    exec(compile(source, path, "exec"), namespace)
+    decode = _decoders[key] = namespace["decode"]
+    return decode
@@ -4,12 +4,14 @@ import ssl
 import urllib.request
 
 
+def ssl_context():
+    return ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=certifi.where())
+
+
 def print_export_url():
-    context = ssl.create_default_context(
-        ssl.Purpose.SERVER_AUTH, cafile=certifi.where()
-    )
     with urllib.request.urlopen(
-        "https://www.marktstammdatenregister.de/MaStR/Datendownload", context=context
+        "https://www.marktstammdatenregister.de/MaStR/Datendownload",
+        context=ssl_context(),
     ) as f:
         html = f.read().decode("utf-8")
         match = re.search(
@@ -19,5 +21,9 @@ def print_export_url():
         return match.group()
 
 
+def open_url(url):
+    return urllib.request.urlopen(url, context=ssl_context())
+
+
 if __name__ == "__main__":
     print(print_export_url())
@@ -0,0 +1,303 @@
+import concurrent.futures
+import datetime
+import duckdb
+import os
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import time
+from tqdm.auto import tqdm
+from typing import Optional
+
+# Rows fetched from DuckDB at a time.
+BATCH_SIZE = 64 * 1024
+
+# Rows written at a time to CSV files with a maximum file size: the size is only
+# known in between.
+SIZE_CHECK_ROWS = 8 * 1024
+
+COMPRESSION_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+
+
+class Options:
+    def __init__(
+        self,
+        compression: Optional[str] = None,
+        max_rows_per_file: Optional[int] = None,
+        max_file_size: Optional[int] = None,
+        row_group_size: Optional[int] = None,
+        dictionary: bool = True,
+    ):
+        self.compression = compression
+        self.max_rows_per_file = max_rows_per_file
+        self.max_file_size = max_file_size
+        self.row_group_size = row_group_size
+        self.dictionary = dictionary
+        for name in ("max_rows_per_file", "max_file_size", "row_group_size"):
+            value = getattr(self, name)
+            if value is not None and value < 1:
+                raise ValueError(f"{name} must be positive, got {value}")
+
+    @property
+    def split(self):
+        return self.max_rows_per_file is not None or self.max_file_size is not None
+
+
+class TableStats:
+    def __init__(self, table, rows, size, files, seconds):
+        self.table = table
+        self.rows = rows
+        self.size = size
+        self.files = files
+        self.seconds = seconds
+
+    def __str__(self):
+        mib = self.size / (1024 * 1024)
+        rate = mib / self.seconds if self.seconds > 0 else 0.0
+        return f"{self.table}: {self.rows} rows, {len(self.files)} files, {mib:.1f} MiB in {self.seconds:.1f}s ({rate:.1f} MiB/s)"
+
+
+class _Writer:
+    """
+    Writes record batches to one file, first under a temporary name.
+
+    Rows are collected into chunks, which are written at once: each chunk is a
+    row group in Parquet files, and the file size is only checked between them.
+    """
+
+    def __init__(self, path, schema: pa.Schema, fmt, options: Options):
+        self.path = path
+        self.fmt = fmt
+        self.max_rows = options.max_rows_per_file
+        self.max_size = options.max_file_size
+        self.rows = 0
+        self.pending: list[pa.RecordBatch] = []
+        self.pending_rows = 0
+        self.sink = pa.OSFile(path + ".tmp", "wb")
+        self.stream = self.sink
+        if fmt == "parquet":
+            self.writer = pq.ParquetWriter(
+                self.sink,
+                schema,
+                compression=(options.compression or "snappy"),
+                use_dictionary=options.dictionary,
+            )
+            self.chunk_rows = options.row_group_size or BATCH_SIZE
+        else:
+            self.stream = (
+                pa.CompressedOutputStream(self.sink, options.compression)
+                if options.compression not in (None, "none")
+                else self.sink
+            )
+            self.writer = pacsv.CSVWriter(self.stream, schema)
+            self.chunk_rows = (
+                SIZE_CHECK_ROWS if options.max_file_size is not None else BATCH_SIZE
+            )
+
+    def room(self) -> int:
+        """
+        The number of rows that fit before the current chunk or the file is full.
+        """
+        room = self.chunk_rows - self.pending_rows
+        if self.max_rows is not None:
+            room = min(room, self.max_rows - self.rows)
+        return room
+
+    def write(self, batch: pa.RecordBatch):
+        """
+        Add `batch`, which must fit into `room()`.
+        """
+        self.pending.append(batch)
+        self.pending_rows += batch.num_rows
+        self.rows += batch.num_rows
+        if self.pending_rows >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        table = pa.Table.from_batches(self.pending)
+        if self.fmt == "parquet":
+            self.writer.write_table(table, row_group_size=self.chunk_rows)
+        else:
+            self.writer.write_table(table)
+        self.pending = []
+        self.pending_rows = 0
+
+    def full(self) -> bool:
+        if self.max_rows is not None and self.rows >= self.max_rows:
+            return True
+        return (
+            self.max_size is not None
+            and not self.pending
+            and self.size() >= self.max_size
+        )
+
+    def size(self):
+        return self.sink.tell()
+
+    def close(self) -> int:
+        self.flush()
+        self.writer.close()
+        # Closing the writer or the compressed stream may already close the file.
+        for f in (self.stream, self.sink):
+            if not f.closed:
+                f.close()
+        os.replace(self.path + ".tmp", self.path)
+        return os.path.getsize(self.path)
+
+    def discard(self):
+        try:
+            self.writer.close()
+        except Exception:
+            # The file is removed anyway, it only must not stay open.
+            pass
+        for f in (self.stream, self.sink):
+            if not f.closed:
+                f.close()
+        os.remove(self.path + ".tmp")
+
+
+def file_name(table, fmt, options: Options, part: Optional[int]):
+    suffix = f"_{part:05d}" if part is not None else ""
+    compression = (
+        COMPRESSION_EXTENSIONS.get(options.compression, "") if fmt == "csv" else ""
+    )
+    return f"{table}{suffix}.{fmt}{compression}"
+
+
+def export_table(
+    con: duckdb.DuckDBPyConnection, table, directory, fmt, options: Options
+) -> TableStats:
+    start = time.perf_counter()
+    cursor = con.cursor()
+    result = cursor.execute(f'select * from "{table}"')
+    # `fetch_record_batch` was renamed to `to_arrow_reader` in newer DuckDB versions.
+    to_arrow_reader = getattr(result, "to_arrow_reader", result.fetch_record_batch)
+    reader = to_arrow_reader(BATCH_SIZE)
+
+    files: list[str] = []
+    rows = 0
+    size = 0
+    writer: Optional[_Writer] = None
+
+    def open_writer():
+        part = len(files) if options.split else None
+        path = os.path.join(directory, file_name(table, fmt, options, part))
+        files.append(path)
+        return _Writer(path, reader.schema, fmt, options)
+
+    try:
+        for batch in reader:
+            while batch.num_rows > 0:
+                if writer is None:
+                    writer = open_writer()
+                n = min(batch.num_rows, writer.room())
+                writer.write(batch.slice(0, n))
+                rows += n
+                batch = batch.slice(n)
+                if writer.full():
+                    size += writer.close()
+                    writer = None
+
+        if not files:
+            # Empty tables still get a file with the header or schema.
+            writer = open_writer()
+        if writer is not None:
+            size += writer.close()
+    except BaseException:
+        if writer is not None and os.path.exists(writer.path + ".tmp"):
+            writer.discard()
+        raise
+    finally:
+        cursor.close()
+    return TableStats(table, rows, size, files, time.perf_counter() - start)
+
+
+def export_files(duckdb_file, directory, fmt, options: Options, jobs: int):
+    """
+    Export every table of `duckdb_file` to `directory` in `jobs` threads, like
+    `export database` does, but with one or more files per table.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with duckdb.connect(duckdb_file, read_only=True) as con:
+        tables = con.sql(
+            "select table_name, sql from duckdb_tables() order by table_name"
+        ).fetchall()
+        all_stats: dict[str, TableStats] = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [
+                pool.submit(export_table, con, table, directory, fmt, options)
+                for table, _ in tables
+            ]
+            for future in tqdm(
+                concurrent.futures.as_completed(futures),
+                total=len(futures),
+                desc=f"Exporting {fmt}",
+            ):
+                stats = future.result()
+                all_stats[stats.table] = stats
+                tqdm.write(str(stats))
+
+    # Same layout as `export database`, so that the export can be imported again.
+    with open(os.path.join(directory, "schema.sql"), "w") as f:
+        for _, sql in tables:
+            f.write(f"{sql}\n")
+    with open(os.path.join(directory, "load.sql"), "w") as f:
+        for table, _ in tables:
+            for path in all_stats[table].files:
+                header = " (format csv, header)" if fmt == "csv" else ""
+                f.write(f"""COPY "{table}" FROM '{path}'{header};\n""")
+    return list(all_stats.values())
+
+
+def export_sqlite(duckdb_file, sqlite_file):
+    """
+    Copy every table of `duckdb_file` into a new SQLite database, one table at a
+    time. Tables are created from their DuckDB definitions, so that they keep
+    their primary keys. The database is built under a temporary name first.
+    """
+    tmp = sqlite_file + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    con = duckdb.connect()
+    try:
+        con.sql(f"attach '{duckdb_file}' as source (read_only)")
+        con.sql(f"attach '{tmp}' as target (type sqlite)")
+        tables = con.sql(
+            "select table_name, sql from duckdb_tables() where database_name = 'source' order by table_name"
+        ).fetchall()
+        # The definitions do not name a database, so create them in the target.
+        con.sql("use target")
+        all_stats = []
+        for table, sql in tqdm(tables, desc="Exporting sqlite"):
+            start = time.perf_counter()
+            before = os.path.getsize(tmp)
+            con.sql(sql)
+            con.sql(f'insert into target."{table}" select * from source."{table}"')
+            (rows,) = con.sql(f'select count(*) from target."{table}"').fetchone()
+            # Each statement is committed, so the growth of the database is
+            # the size of the table.
+            stats = TableStats(
+                table,
+                rows,
+                os.path.getsize(tmp) - before,
+                [sqlite_file],
+                time.perf_counter() - start,
+            )
+            all_stats.append(stats)
+            tqdm.write(str(stats))
+        con.close()
+    except BaseException:
+        con.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, sqlite_file)
+    return all_stats
+
+
+def print_total(message, all_stats: list[TableStats], start):
+    delta = datetime.timedelta(seconds=time.perf_counter() - start)
+    rows = sum(s.rows for s in all_stats)
+    print(f"{message}: {len(all_stats)} tables, {rows} rows, took {str(delta)}")
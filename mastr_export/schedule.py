@@ -0,0 +1,324 @@
+from . import decoder
+from .spec import Spec
+
+import concurrent.futures
+import heapq
+import json
+import multiprocessing
+import os
+import polars as pl
+import tempfile
+import time
+import zipfile
+from typing import Iterator, Optional
+
+# Uncompressed XML bytes parsed per second, for specs without any history.
+DEFAULT_THROUGHPUT = 32 * 1024 * 1024
+
+# Members smaller than this are grouped into shared tasks of about this size.
+SMALL_TASK_SIZE = 16 * 1024 * 1024
+
+# Weight of the latest measurement when updating the throughput history.
+HISTORY_WEIGHT = 0.5
+
+# Tasks are only started if the members from the next one to be yielded up to
+# the task's last member add up to at most this many uncompressed bytes. This
+# bounds the parsed DataFrames that wait for an earlier member to be yielded.
+LOOKAHEAD = 2 * 1024 * 1024 * 1024
+
+
+class Throughput:
+    """
+    Per-spec parsing throughput in bytes per second, optionally persisted as JSON
+    so that later runs can estimate the cost of each member.
+    """
+
+    def __init__(self, history_file: Optional[str] = None):
+        self.history_file = history_file
+        self.history: dict[str, float] = {}
+        if history_file is not None and os.path.exists(history_file):
+            with open(history_file) as f:
+                self.history = json.load(f)
+
+    def estimate(self, spec: Spec, size: int) -> float:
+        return size / self.history.get(spec.element, DEFAULT_THROUGHPUT)
+
+    def update(self, measured: dict[str, float]):
+        for element, throughput in measured.items():
+            previous = self.history.get(element)
+            self.history[element] = (
+                throughput
+                if previous is None
+                else HISTORY_WEIGHT * throughput + (1 - HISTORY_WEIGHT) * previous
+            )
+
+    def save(self):
+        if self.history_file is None:
+            return
+        # A unique temporary file, so that concurrent runs do not write into each
+        # other's history before it is renamed.
+        fd, tmp = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(self.history_file)),
+            prefix=os.path.basename(self.history_file) + ".",
+            suffix=".tmp",
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.history, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.history_file)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+
+class Task:
+    def __init__(self, members: list[tuple[int, zipfile.ZipInfo, Spec]], predicted):
+        self.members = members
+        self.predicted = predicted
+
+
+def plan_tasks(
+    xml_files: list[tuple[zipfile.ZipInfo, Spec]],
+    throughput: Throughput,
+    small_task_size: int = SMALL_TASK_SIZE,
+) -> list[Task]:
+    """
+    Turn the members into tasks, most expensive first: each large member is a task
+    of its own, and consecutive small members are grouped together.
+    """
+    tasks: list[Task] = []
+    group: list[tuple[int, zipfile.ZipInfo, Spec]] = []
+    group_size = 0
+    group_cost = 0.0
+    for n, (i, d) in enumerate(xml_files):
+        cost = throughput.estimate(d, i.file_size)
+        if i.file_size >= small_task_size:
+            tasks.append(Task([(n, i, d)], cost))
+            continue
+        group.append((n, i, d))
+        group_size += i.file_size
+        group_cost += cost
+        if group_size >= small_task_size:
+            tasks.append(Task(group, group_cost))
+            group, group_size, group_cost = [], 0, 0.0
+    if group:
+        tasks.append(Task(group, group_cost))
+    tasks.sort(key=lambda t: (-t.predicted, t.members[0][0]))
+    return tasks
+
+
+def _ends(xml_files: list[tuple[zipfile.ZipInfo, Spec]]) -> list[int]:
+    # ends[n] is the number of bytes in members 0 to n - 1.
+    ends = [0]
+    for i, _ in xml_files:
+        ends.append(ends[-1] + i.file_size)
+    return ends
+
+
+def _next_task(
+    pending: list[Task],
+    task_of: dict[int, Task],
+    ends: list[int],
+    next_member: int,
+    lookahead: int,
+) -> Optional[Task]:
+    """
+    The task holding `next_member` if it is pending, else the first pending task
+    that ends within `lookahead` bytes of it.
+    """
+    head = task_of.get(next_member)
+    if head in pending:
+        return head
+    for task in pending:
+        last = task.members[-1][0]
+        if ends[last + 1] - ends[next_member] <= lookahead:
+            return task
+    return None
+
+
+def predict_wall_time(
+    tasks: list[Task],
+    xml_files: list[tuple[zipfile.ZipInfo, Spec]],
+    jobs: int,
+    lookahead: int = LOOKAHEAD,
+) -> float:
+    """
+    Simulate `execute` running `tasks` on `jobs` workers, assuming that the results
+    are consumed as soon as they are in order.
+    """
+    ends = _ends(xml_files)
+    task_of = dict((n, task) for task in tasks for n, _, _ in task.members)
+    pending = list(tasks)
+    # (finish time, start order, task)
+    running: list[tuple[float, int, Task]] = []
+    done: set[int] = set()
+    next_member = 0
+    now = 0.0
+    started = 0
+
+    def start_tasks():
+        nonlocal started
+        while pending and len(running) < jobs:
+            task = _next_task(pending, task_of, ends, next_member, lookahead)
+            if task is None:
+                return
+            pending.remove(task)
+            heapq.heappush(running, (now + task.predicted, started, task))
+            started += 1
+
+    start_tasks()
+    while running:
+        now, _, task = heapq.heappop(running)
+        done.update(n for n, _, _ in task.members)
+        start_tasks()
+        while next_member in done:
+            next_member += 1
+            start_tasks()
+    return now
+
+
+def parse(d: Spec, f, filename) -> pl.DataFrame:
+    decode = decoder.for_spec(d)
+    return pl.DataFrame(data=decode(f, filename), schema=d.polars_schema())
+
+
+_specs: dict[str, Spec] = {}
+
+
+def _parse_task(
+    export, members: list[tuple[int, str, dict]]
+) -> list[tuple[int, pl.DataFrame, float]]:
+    # Specs are sent as plain objects: their converters are not picklable.
+    results = []
+    with zipfile.ZipFile(export) as z:
+        for n, filename, spec_object in members:
+            d = _specs.get(spec_object["element"])
+            if d is None:
+                d = _specs[spec_object["element"]] = Spec(**spec_object)
+            start = time.perf_counter()
+            with z.open(filename) as f:
+                df = parse(d, f, filename)
+            results.append((n, df, time.perf_counter() - start))
+    return results
+
+
+class Report:
+    """
+    Predicted and actual parsing time, per spec and for the whole run, and the
+    column statistics if they were gathered.
+    """
+
+    def __init__(self, jobs, predicted_wall_time: Optional[float]):
+        self.jobs = jobs
+        self.predicted_wall_time = predicted_wall_time
+        self.actual_wall_time = None
+        self.specs: dict[str, dict] = {}
+        self.column_stats: Optional[list[dict]] = None
+
+    def add(self, d: Spec, size, predicted, actual):
+        s = self.specs.setdefault(
+            d.element,
+            {"files": 0, "bytes": 0, "predicted_seconds": 0.0, "actual_seconds": 0.0},
+        )
+        s["files"] += 1
+        s["bytes"] += size
+        s["predicted_seconds"] += predicted
+        s["actual_seconds"] += actual
+
+    def throughput(self) -> dict[str, float]:
+        return dict(
+            (element, s["bytes"] / s["actual_seconds"])
+            for element, s in self.specs.items()
+            if s["actual_seconds"] > 0 and s["bytes"] > 0
+        )
+
+    def to_object(self):
+        return {
+            "jobs": self.jobs,
+            "predicted_wall_seconds": self.predicted_wall_time,
+            "actual_wall_seconds": self.actual_wall_time,
+            "specs": self.specs,
+            "column_stats": self.column_stats,
+        }
+
+    def save(self, report_file):
+        with open(report_file, "w") as f:
+            json.dump(self.to_object(), f, indent=2)
+
+    def summary(self) -> str:
+        summary = f"Parsing took {self.actual_wall_time:.1f}s with {self.jobs} jobs"
+        if self.predicted_wall_time is None:
+            return summary
+        return f"{summary}, predicted {self.predicted_wall_time:.1f}s"
+
+
+def execute(
+    export,
+    xml_files: list[tuple[zipfile.ZipInfo, Spec]],
+    jobs: int,
+    throughput: Throughput,
+    report: Report,
+    progress,
+    lookahead: int = LOOKAHEAD,
+    small_task_size: int = SMALL_TASK_SIZE,
+) -> Iterator[tuple[zipfile.ZipInfo, Spec, pl.DataFrame]]:
+    """
+    Parse `xml_files` in a pool of `jobs` processes, scheduled by `plan_tasks`.
+
+    Results are yielded in the order of `xml_files`, so that they are loaded in
+    spec order no matter which task finishes first. The task holding the next
+    member to be yielded is always started first, and other tasks only within
+    `lookahead` bytes of it.
+    """
+    tasks = plan_tasks(xml_files, throughput, small_task_size)
+    report.predicted_wall_time = predict_wall_time(tasks, xml_files, jobs, lookahead)
+    task_of = dict((n, task) for task in tasks for n, _, _ in task.members)
+    ends = _ends(xml_files)
+
+    pending = list(tasks)
+    running: dict[concurrent.futures.Future, Task] = {}
+    done: dict[int, tuple[pl.DataFrame, float]] = {}
+    next_member = 0
+
+    def start_tasks():
+        while pending and len(running) < jobs:
+            task = _next_task(pending, task_of, ends, next_member, lookahead)
+            if task is None:
+                return
+            pending.remove(task)
+            future = pool.submit(
+                _parse_task,
+                export,
+                [(n, i.filename, d.to_object()) for n, i, d in task.members],
+            )
+            running[future] = task
+
+    # Forking would copy the state of the target threads and of Polars.
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs, mp_context=context
+    ) as pool:
+        try:
+            start_tasks()
+            while running:
+                finished, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in finished:
+                    del running[future]
+                    for n, df, seconds in future.result():
+                        done[n] = (df, seconds)
+                        progress.update(xml_files[n][0].file_size)
+                start_tasks()
+                while next_member in done:
+                    i, d = xml_files[next_member]
+                    df, seconds = done.pop(next_member)
+                    report.add(
+                        d, i.file_size, throughput.estimate(d, i.file_size), seconds
+                    )
+                    yield i, d, df
+                    next_member += 1
+                    start_tasks()
+        finally:
+            for future in running:
+                future.cancel()
@@ -0,0 +1,194 @@
+from .spec import Spec, Specs
+from .targets import Target
+
+import argparse
+import hashlib
+import json
+import os
+import polars as pl
+import zipfile
+from typing import Iterator, Optional
+
+# Written into every shard directory, see `identity`.
+IDENTITY_FILE = "shard.json"
+
+
+def plan(specs: Specs, export) -> dict:
+    """
+    Read the central directory of `export` and list its members as work units,
+    in the order in which they have to be loaded.
+    """
+    with zipfile.ZipFile(export) as z:
+        xml_files = specs.in_load_order(z.infolist())
+
+    units = []
+    for i, d in xml_files:
+        units.append(
+            {
+                "unit": len(units),
+                "member": i.filename,
+                "table": d.element,
+                "compress_size": i.compress_size,
+                "file_size": i.file_size,
+            }
+        )
+    return {
+        "export": os.path.basename(export),
+        "export_size": os.path.getsize(export),
+        "units": units,
+    }
+
+
+def save_manifest(manifest: dict, manifest_file):
+    with open(manifest_file, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_manifest(manifest_file) -> dict:
+    with open(manifest_file) as f:
+        return json.load(f)
+
+
+def parse_shard(s: str) -> tuple[int, int]:
+    index, sep, count = s.partition("/")
+    if not sep or not index.isdigit() or not count.isdigit():
+        raise argparse.ArgumentTypeError(f"Expected INDEX/COUNT, got {s}")
+    index, count = int(index), int(count)
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Expected 0 <= INDEX < COUNT, got {s}")
+    return index, count
+
+
+def assign(units: list[dict], count: int) -> list[list[dict]]:
+    """
+    Distribute `units` over `count` shards, largest unit first onto the shard with
+    the fewest uncompressed bytes so far. The result only depends on the manifest,
+    so every node computes the same assignment.
+    """
+    shards: list[list[dict]] = [[] for _ in range(count)]
+    sizes = [0] * count
+    for unit in sorted(units, key=lambda u: (-u["file_size"], u["unit"])):
+        smallest = min(range(count), key=lambda k: (sizes[k], k))
+        shards[smallest].append(unit)
+        sizes[smallest] += unit["file_size"]
+    for shard in shards:
+        shard.sort(key=lambda u: u["unit"])
+    return shards
+
+
+def _manifest_identity(manifest: dict) -> dict:
+    units = json.dumps(manifest["units"], sort_keys=True).encode("utf-8")
+    return {
+        "export": manifest["export"],
+        "export_size": manifest["export_size"],
+        "units_sha256": hashlib.sha256(units).hexdigest(),
+    }
+
+
+def identity(manifest: dict, index, count) -> dict:
+    """
+    Identify the manifest and shard that the units in a shard directory belong
+    to, so that `merge` can tell them from leftovers of earlier runs.
+    """
+    return {**_manifest_identity(manifest), "index": index, "count": count}
+
+
+def _read_identity(directory) -> Optional[dict]:
+    path = os.path.join(directory, IDENTITY_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def shard_dir(directory, index, count):
+    return os.path.join(directory, f"shard-{index}-of-{count}")
+
+
+def unit_path(directory, unit: dict):
+    return os.path.join(directory, unit["table"], f"{unit['unit']:06d}.parquet")
+
+
+class ShardTarget(Target):
+    """
+    Write each unit to its own Parquet file, without removing duplicates: that is
+    left to `merge`, which sees the units of all shards in order.
+    """
+
+    def __init__(self, directory, units: list[dict], identity: dict):
+        self.directory = directory
+        self.units = dict((unit["member"], unit) for unit in units)
+        self.identity = identity
+
+    def open(self, specs):
+        if os.path.exists(self.directory) and os.listdir(self.directory):
+            if _read_identity(self.directory) != self.identity:
+                raise Exception(
+                    f"{self.directory} contains the output of a different manifest or shard, remove it first"
+                )
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, IDENTITY_FILE), "w") as f:
+            json.dump(self.identity, f, indent=2)
+
+    def write(self, filename, spec, df):
+        path = unit_path(self.directory, self.units[filename])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so that `merge` never sees partial units.
+        df.write_parquet(path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+
+def read_shards(
+    specs: Specs, manifest: dict, directory
+) -> Iterator[tuple[str, Spec, pl.DataFrame]]:
+    """
+    Read the units written by all shards in manifest order, i.e. in the order of
+    the specs and within a spec in the order of the members in the export.
+
+    Every shard directory must have been written for `manifest`, and each unit
+    must have been extracted by exactly one shard.
+    """
+    expected = _manifest_identity(manifest)
+    shard_dirs = []
+    for d in sorted(os.listdir(directory)):
+        if not d.startswith("shard-"):
+            continue
+        d = os.path.join(directory, d)
+        written = _read_identity(d)
+        if written is None:
+            raise Exception(
+                f"{d}: Missing {IDENTITY_FILE}, not written by `extract --shard`"
+            )
+        if any(written.get(key) != value for key, value in expected.items()):
+            raise Exception(
+                f"{d}: Written for a different manifest (export {written.get('export')}, {written.get('export_size')} bytes)"
+            )
+        shard_dirs.append(d)
+
+    paths = {}
+    missing = []
+    duplicate = []
+    for unit in manifest["units"]:
+        found = [
+            unit_path(d, unit) for d in shard_dirs if os.path.exists(unit_path(d, unit))
+        ]
+        if not found:
+            missing.append(unit["member"])
+        elif len(found) > 1:
+            duplicate.append(f"{unit['member']} ({', '.join(found)})")
+        else:
+            paths[unit["unit"]] = found[0]
+    if missing:
+        raise Exception(
+            f"{len(missing)} units have not been extracted by any shard: {', '.join(missing)}"
+        )
+    if duplicate:
+        raise Exception(
+            f"{len(duplicate)} units have been extracted by several shards: {', '.join(duplicate)}"
+        )
+
+    specs_by_element = dict((d.element, d) for d in specs)
+    for unit in manifest["units"]:
+        yield unit["member"], specs_by_element[unit["table"]], pl.read_parquet(
+            paths[unit["unit"]]
+        )
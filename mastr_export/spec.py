@@ -5,6 +5,7 @@ from typing import Iterator, Optional
 import polars as pl
 import os.path
 import yaml
+import zipfile
 
 XSD_TO_POLARS = {
     # Date and time
@@ -43,11 +44,20 @@ XSD_TO_PYTHON = {
 }
 
 XSD_TO_SQLITE = {
-    "boolean": "integer",
+    # Date and time
     "date": "text",
     "dateTime": "text",
+    # Float
+    "float": "real",
+    "double": "real",
     "decimal": "real",
+    # Int
+    "byte": "integer",
+    "short": "integer",
+    "int": "integer",
     "nonNegativeInteger": "integer",
+    # Other
+    "boolean": "integer",
     "string": "text",
 }
 
@@ -175,6 +185,9 @@ class Spec:
 ) strict{", without rowid" if self.without_rowid else ""};
 """
 
+    def polars_schema(self) -> dict[str, pl.DataType]:
+        return dict((name, field.polars_type) for name, field in self.fields.items())
+
     def sqlite_indices(self) -> list[str]:
         return [
             field.sqlite_index(self.element)
@@ -263,3 +276,21 @@ class Specs:
             if filename.startswith(descr.root):
                 return descr
         raise Exception(f"No spec for {filename}")
+
+    def in_load_order(
+        self, infos: list[zipfile.ZipInfo]
+    ) -> list[tuple[zipfile.ZipInfo, Spec]]:
+        """
+        The XML files of an export in the order in which they are loaded: in the
+        order of their specs, and within a spec in the order of the export.
+        """
+        # Sanity check: do we know how to handle all the files in the export?
+        spec_to_xml_files: dict[str, list[zipfile.ZipInfo]] = {}
+        for i in infos:
+            d = self.for_file(i.filename)
+            if not i.filename.endswith(".xml"):
+                raise Exception(f"Expected only XML files, got {i.filename}")
+            spec_to_xml_files.setdefault(d.element, []).append(i)
+        return [
+            (i, d) for d in self.specs for i in spec_to_xml_files.get(d.element, [])
+        ]
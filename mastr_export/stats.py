@@ -0,0 +1,195 @@
+from .spec import Spec, Specs
+
+import math
+import polars as pl
+from typing import Iterable, Iterator, Optional
+
+TABLE = "_column_stats"
+
+# HyperLogLog with 2**12 registers has a standard error of about 1.6%.
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+HLL_SUFFIX_BITS = 64 - HLL_PRECISION
+
+# Integer types, narrowest first, with the range of values they can hold.
+XSD_INTEGER_RANGES = {
+    "byte": (-(1 << 7), (1 << 7) - 1),
+    "short": (-(1 << 15), (1 << 15) - 1),
+    "int": (-(1 << 31), (1 << 31) - 1),
+    "nonNegativeInteger": (0, (1 << 64) - 1),
+}
+
+
+class HyperLogLog:
+    """
+    Estimates the number of distinct values in a column from a fixed number of
+    registers, which are updated one batch at a time.
+    """
+
+    def __init__(self):
+        self.registers = pl.DataFrame(schema={"register": pl.UInt64, "rank": pl.Int64})
+
+    def update(self, s: pl.Series):
+        h = pl.col("h")
+        suffix = h % (1 << HLL_SUFFIX_BITS)
+        # The rank is the position of the first set bit in the suffix, counting
+        # from 1 at the most significant bit.
+        rank = (
+            pl.when(suffix == 0)
+            .then(HLL_SUFFIX_BITS + 1)
+            .otherwise(HLL_SUFFIX_BITS - suffix.cast(pl.Float64).log(2).floor())
+            .cast(pl.Int64)
+        )
+        batch = (
+            pl.DataFrame({"h": s.drop_nulls().hash(seed=0)})
+            .select(register=h // (1 << HLL_SUFFIX_BITS), rank=rank)
+            .group_by("register")
+            .agg(pl.col("rank").max())
+        )
+        self.registers = (
+            pl.concat([self.registers, batch])
+            .group_by("register")
+            .agg(pl.col("rank").max())
+        )
+
+    def estimate(self) -> int:
+        m = HLL_REGISTERS
+        zeros = m - len(self.registers)
+        z = zeros + sum(2.0**-r for r in self.registers["rank"])
+        e = 0.7213 / (1 + 1.079 / m) * m * m / z
+        if e <= 2.5 * m and zeros > 0:
+            e = m * math.log(m / zeros)
+        return round(e)
+
+
+class ColumnStats:
+    def __init__(self, table, column, xsd):
+        self.table = table
+        self.column = column
+        self.xsd = xsd
+        self.rows = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.min_length: Optional[int] = None
+        self.max_length: Optional[int] = None
+        self.distinct = HyperLogLog()
+
+    def update(self, s: pl.Series):
+        self.rows += len(s)
+        self.nulls += s.null_count()
+        if self.nulls == self.rows:
+            return
+        lo, hi = s.min(), s.max()
+        if lo is not None:
+            self.min = lo if self.min is None else min(self.min, lo)
+            self.max = hi if self.max is None else max(self.max, hi)
+        if s.dtype == pl.Utf8:
+            lengths = s.str.len_chars()
+            lo, hi = lengths.min(), lengths.max()
+            if lo is not None:
+                self.min_length = (
+                    lo if self.min_length is None else min(self.min_length, lo)
+                )
+                self.max_length = (
+                    hi if self.max_length is None else max(self.max_length, hi)
+                )
+        self.distinct.update(s)
+
+    def narrowest_xsd(self) -> Optional[str]:
+        """
+        The narrowest integer type that holds all observed values, if the declared
+        type is an integer type.
+        """
+        if self.xsd not in XSD_INTEGER_RANGES or self.min is None:
+            return None
+        for xsd, (lo, hi) in XSD_INTEGER_RANGES.items():
+            if lo <= self.min and self.max <= hi:
+                return xsd
+        return self.xsd
+
+    def is_wider_than_observed(self) -> bool:
+        narrowest = self.narrowest_xsd()
+        return narrowest is not None and narrowest != self.xsd
+
+    def to_object(self):
+        return {
+            "table": self.table,
+            "column": self.column,
+            "xsd": self.xsd,
+            "rows": self.rows,
+            "nulls": self.nulls,
+            "null_ratio": self.nulls / self.rows if self.rows > 0 else None,
+            "distinct_estimate": (
+                self.distinct.estimate() if self.nulls < self.rows else 0
+            ),
+            "min": str(self.min) if self.min is not None else None,
+            "max": str(self.max) if self.max is not None else None,
+            "min_length": self.min_length,
+            "max_length": self.max_length,
+            "narrowest_xsd": self.narrowest_xsd(),
+        }
+
+
+class Statistics:
+    """
+    Column statistics for all specs, gathered from the parsed batches before
+    duplicate primary keys are dropped.
+    """
+
+    def __init__(self, specs: Specs):
+        self.columns = dict(
+            (
+                spec.element,
+                [
+                    ColumnStats(spec.element, field.name, field.xsd)
+                    for field in spec.fields.values()
+                ],
+            )
+            for spec in specs
+        )
+
+    def update(self, spec: Spec, df: pl.DataFrame):
+        for column in self.columns[spec.element]:
+            column.update(df[column.column])
+
+    def observe(
+        self, batches: Iterable[tuple[str, Spec, pl.DataFrame]]
+    ) -> Iterator[tuple[str, Spec, pl.DataFrame]]:
+        for filename, spec, df in batches:
+            self.update(spec, df)
+            yield filename, spec, df
+
+    def wider_than_observed(self) -> list[ColumnStats]:
+        return [
+            column
+            for columns in self.columns.values()
+            for column in columns
+            if column.is_wider_than_observed()
+        ]
+
+    def to_objects(self) -> list[dict]:
+        return [
+            column.to_object()
+            for columns in self.columns.values()
+            for column in columns
+        ]
+
+    def to_dataframe(self) -> pl.DataFrame:
+        return pl.DataFrame(
+            self.to_objects(),
+            schema={
+                "table": pl.Utf8,
+                "column": pl.Utf8,
+                "xsd": pl.Utf8,
+                "rows": pl.Int64,
+                "nulls": pl.Int64,
+                "null_ratio": pl.Float64,
+                "distinct_estimate": pl.Int64,
+                "min": pl.Utf8,
+                "max": pl.Utf8,
+                "min_length": pl.Int64,
+                "max_length": pl.Int64,
+                "narrowest_xsd": pl.Utf8,
+            },
+        )
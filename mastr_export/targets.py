@@ -0,0 +1,402 @@
+from .spec import Spec, Specs
+
+import abc
+import argparse
+import duckdb
+import os
+import polars as pl
+import pyarrow.parquet as pq
+import queue
+import sqlite3
+import threading
+from typing import Callable, Iterable, Optional
+
+CENSUS_TABLE = "Zensus2022"
+
+# Number of batches each target may fall behind the producer.
+BUFFER_SIZE = 4
+
+
+class Target(abc.ABC):
+    """
+    A destination for the converted export.
+
+    `open`, `write`, `write_table`, `write_census`, `close` and `abort` are all
+    called from the same thread, so implementations may hold on to thread-bound
+    resources such as a SQLite connection.
+    """
+
+    def open(self, specs: Specs):
+        pass
+
+    @abc.abstractmethod
+    def write(self, filename: str, spec: Spec, df: pl.DataFrame):
+        pass
+
+    def write_table(self, name: str, df: pl.DataFrame):
+        """
+        Write a table that is not described by a spec, replacing any existing one.
+        """
+        pass
+
+    def write_census(self, census: str):
+        pass
+
+    def close(self):
+        pass
+
+    def abort(self):
+        """
+        Release all resources after a failed run, without finalizing the output.
+        """
+        pass
+
+
+class DuckDBTarget(Target):
+    def __init__(self, duckdb_file):
+        self.duckdb_file = duckdb_file
+
+    def open(self, specs: Specs):
+        self.con = duckdb.connect(self.duckdb_file)
+        for spec in specs:
+            self.con.sql(spec.duckdb_schema())
+
+    def write(self, filename, spec, df):
+        try:
+            if spec.primary is None:
+                self.con.sql(f"""INSERT INTO "{spec.element}" SELECT * FROM df""")
+            else:
+                self.con.sql(
+                    f"""INSERT OR IGNORE INTO "{spec.element}" SELECT * FROM df"""
+                )
+        except duckdb.ConstraintException as e:
+            e.add_note(f"File: {filename}")
+            e.add_note(str(df))
+            raise
+
+    def write_table(self, name, df):
+        self.con.sql(f"""CREATE OR REPLACE TABLE "{name}" AS SELECT * FROM df""")
+
+    def write_census(self, census):
+        self.con.sql(
+            f"CREATE TABLE {CENSUS_TABLE} (AGS TEXT PRIMARY KEY, Gemeinde TEXT NOT NULL, AnzahlPersonen UINTEGER NOT NULL)"
+        )
+        self.con.sql(f"INSERT INTO {CENSUS_TABLE} (SELECT * FROM '{census}')")
+
+    def close(self):
+        self.con.sql("VACUUM ANALYZE")
+        self.con.close()
+
+    def abort(self):
+        self.con.close()
+
+
+def _sqlite_type(dtype: pl.DataType) -> str:
+    if dtype.is_integer() or dtype == pl.Boolean:
+        return "integer"
+    if dtype.is_float():
+        return "real"
+    return "text"
+
+
+class SQLiteTarget(Target):
+    def __init__(self, sqlite_file):
+        self.sqlite_file = sqlite_file
+
+    def open(self, specs: Specs):
+        self.con = sqlite3.connect(self.sqlite_file)
+        with self.con:
+            for spec in specs:
+                self.con.execute(spec.sqlite_schema())
+
+    def write(self, filename, spec, df):
+        with self.con:
+            columns = ", ".join(f"'{name}'" for name in df.columns)
+            values = ", ".join("?" for _ in range(len(df.columns)))
+            stmt = f"""INSERT INTO "{spec.element}" ({columns}) VALUES ({values})"""
+            if spec.primary is not None:
+                stmt += " ON CONFLICT DO NOTHING"
+            try:
+                self.con.executemany(stmt, df.iter_rows())
+            except sqlite3.IntegrityError as e:
+                e.add_note(f"File: {filename}")
+                raise
+
+    def write_table(self, name, df):
+        columns = ", ".join(
+            f""""{column}" {_sqlite_type(dtype)}"""
+            for column, dtype in df.schema.items()
+        )
+        values = ", ".join("?" for _ in range(len(df.columns)))
+        with self.con:
+            self.con.execute(f'drop table if exists "{name}"')
+            self.con.execute(f"""create table "{name}" ({columns}) strict""")
+            self.con.executemany(
+                f"""insert into "{name}" values ({values})""", df.iter_rows()
+            )
+
+    def write_census(self, census):
+        df = pl.read_parquet(census)
+        with self.con:
+            self.con.execute(
+                f"create table {CENSUS_TABLE} (AGS text primary key, Gemeinde text not null, AnzahlPersonen integer not null) strict"
+            )
+            self.con.executemany(
+                f"insert into {CENSUS_TABLE} values (?, ?, ?)", df.iter_rows()
+            )
+
+    def close(self):
+        with self.con:
+            self.con.execute("ANALYZE")
+            self.con.execute("VACUUM")
+        self.con.close()
+
+    def abort(self):
+        self.con.close()
+
+
+class _FileTarget(Target):
+    """
+    Writes one file per table into a directory. Rows with a primary key that has
+    already been written are dropped, like `INSERT OR IGNORE` does for the
+    database targets.
+    """
+
+    extension: str
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def open(self, specs: Specs):
+        os.makedirs(self.directory, exist_ok=True)
+        self.specs = specs
+        self.seen: dict[str, set] = {}
+        self.written: set[str] = set()
+
+    def path(self, table):
+        return os.path.join(self.directory, f"{table}.{self.extension}")
+
+    def dedupe(self, spec: Spec, df: pl.DataFrame) -> pl.DataFrame:
+        if spec.primary is None:
+            return df
+        df = df.unique(subset=spec.primary, keep="first", maintain_order=True)
+        seen = self.seen.setdefault(spec.element, set())
+        if seen:
+            df = df.filter(
+                pl.Series(
+                    [key not in seen for key in df[spec.primary]], dtype=pl.Boolean
+                )
+            )
+        seen.update(df[spec.primary])
+        return df
+
+    def write(self, filename, spec, df):
+        self.append(spec.element, self.dedupe(spec, df))
+        self.written.add(spec.element)
+
+    def write_table(self, name, df):
+        self.append(name, df)
+
+    def write_census(self, census):
+        self.append(CENSUS_TABLE, pl.read_parquet(census))
+
+    @abc.abstractmethod
+    def append(self, table: str, df: pl.DataFrame):
+        pass
+
+    @abc.abstractmethod
+    def tables(self) -> Iterable[str]:
+        """
+        The tables that have a file.
+        """
+        pass
+
+    @abc.abstractmethod
+    def close_files(self):
+        pass
+
+    def close(self):
+        # Tables without any rows still get a file, as with `export database`.
+        for spec in self.specs:
+            if spec.element not in self.written:
+                self.append(spec.element, pl.DataFrame(schema=spec.polars_schema()))
+        self.close_files()
+
+    def abort(self):
+        # Partly written files would look like a complete export.
+        self.close_files()
+        for table in self.tables():
+            os.remove(self.path(table))
+
+
+class ParquetTarget(_FileTarget):
+    extension = "parquet"
+
+    def open(self, specs):
+        super().open(specs)
+        self.writers: dict[str, pq.ParquetWriter] = {}
+
+    def append(self, table, df):
+        t = df.to_arrow()
+        if table not in self.writers:
+            self.writers[table] = pq.ParquetWriter(self.path(table), t.schema)
+        self.writers[table].write_table(t)
+
+    def tables(self):
+        return self.writers.keys()
+
+    def close_files(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+class CSVTarget(_FileTarget):
+    extension = "csv"
+
+    def open(self, specs):
+        super().open(specs)
+        self.files = {}
+
+    def append(self, table, df):
+        if table not in self.files:
+            self.files[table] = open(self.path(table), "wb")
+            df.write_csv(self.files[table], include_header=True)
+        else:
+            df.write_csv(self.files[table], include_header=False)
+
+    def tables(self):
+        return self.files.keys()
+
+    def close_files(self):
+        for f in self.files.values():
+            f.close()
+
+
+TARGETS = {
+    "duckdb": DuckDBTarget,
+    "sqlite": SQLiteTarget,
+    "parquet": ParquetTarget,
+    "csv": CSVTarget,
+}
+
+
+def parse_target(s: str) -> Target:
+    kind, sep, path = s.partition(":")
+    if not sep or not path or kind not in TARGETS:
+        raise argparse.ArgumentTypeError(
+            f"Expected KIND:PATH with KIND one of {', '.join(TARGETS)}, got {s}"
+        )
+    return TARGETS[kind](path)
+
+
+# Ends the batches of a run, successful or not.
+_DONE = object()
+_ABORT = object()
+# Sent once every target has received everything, if all of them succeeded.
+_COMMIT = object()
+
+
+class _Table:
+    def __init__(self, name: str, df: pl.DataFrame):
+        self.name = name
+        self.df = df
+
+
+def _run(
+    target: Target,
+    specs: Specs,
+    census: Optional[str],
+    q: queue.Queue,
+    errors,
+    drained: threading.Event,
+):
+    item = None
+    opened = False
+    try:
+        target.open(specs)
+        opened = True
+        while (item := q.get()) is not _DONE and item is not _ABORT:
+            if isinstance(item, _Table):
+                target.write_table(item.name, item.df)
+            else:
+                target.write(*item)
+        if item is _DONE and census:
+            target.write_census(census)
+    except BaseException as e:
+        errors.append(e)
+        # Keep draining so that the producer never blocks on this target.
+        while item is not _DONE and item is not _ABORT:
+            item = q.get()
+    drained.set()
+
+    decision = q.get()
+    if not opened:
+        return
+    try:
+        if decision is _COMMIT:
+            target.close()
+        else:
+            target.abort()
+    except BaseException as e:
+        errors.append(e)
+
+
+def fan_out(
+    targets: list[Target],
+    specs: Specs,
+    batches: Iterable[tuple[str, Spec, pl.DataFrame]],
+    census: Optional[str] = None,
+    buffer_size: int = BUFFER_SIZE,
+    tables: Optional[Callable[[], dict[str, pl.DataFrame]]] = None,
+):
+    """
+    Write every batch to all `targets`, each in its own thread.
+
+    Each target has a queue of at most `buffer_size` batches. A slow target only
+    holds up the producer (and thereby the other targets) once its queue is full.
+    Once all batches have been written, the tables returned by `tables` and the
+    census are written as well.
+
+    Targets are only finalized once every target has written everything. If the
+    producer or any target fails before that, all targets are aborted instead.
+    """
+    if buffer_size < 1:
+        raise ValueError(f"Expected a buffer size of at least 1, got {buffer_size}")
+    errors: list[BaseException] = []
+    queues = [queue.Queue(maxsize=buffer_size) for _ in targets]
+    drained = [threading.Event() for _ in targets]
+    threads = [
+        threading.Thread(
+            target=_run,
+            args=(t, specs, census, q, errors, d),
+            name=type(t).__name__,
+        )
+        for t, q, d in zip(targets, queues, drained)
+    ]
+    for thread in threads:
+        thread.start()
+    done = False
+    try:
+        for batch in batches:
+            if errors:
+                break
+            for q in queues:
+                q.put(batch)
+        else:
+            if tables is not None and not errors:
+                for name, df in tables().items():
+                    for q in queues:
+                        q.put(_Table(name, df))
+            done = True
+    finally:
+        for q in queues:
+            q.put(_DONE if done else _ABORT)
+        for d in drained:
+            d.wait()
+        decision = _COMMIT if done and not errors else _ABORT
+        for q in queues:
+            q.put(decision)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
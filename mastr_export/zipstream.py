@@ -0,0 +1,385 @@
+import io
+import os
+import struct
+import time
+import zipfile
+import zlib
+from typing import Iterator, Optional
+
+LOCAL_FILE_HEADER = b"PK\x03\x04"
+DATA_DESCRIPTOR = b"PK\x07\x08"
+CENTRAL_DIRECTORY_HEADER = b"PK\x01\x02"
+ZIP64_END_OF_CENTRAL_DIRECTORY = b"PK\x06\x06"
+ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR = b"PK\x06\x07"
+END_OF_CENTRAL_DIRECTORY = b"PK\x05\x06"
+
+# Signature excluded, see APPNOTE.TXT sections 4.3.7, 4.3.12, 4.3.14, 4.3.15, 4.3.16.
+LOCAL_FILE_HEADER_STRUCT = struct.Struct("<HHHHHIIIHH")
+CENTRAL_DIRECTORY_HEADER_STRUCT = struct.Struct("<HHHHHHIIIHHHHHII")
+ZIP64_END_OF_CENTRAL_DIRECTORY_STRUCT = struct.Struct("<QHHIIQQQQ")
+ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR_STRUCT = struct.Struct("<IQI")
+END_OF_CENTRAL_DIRECTORY_STRUCT = struct.Struct("<HHHHIIH")
+
+FLAG_DATA_DESCRIPTOR = 0x08
+ZIP64_EXTRA = 0x0001
+ZIP64_LIMIT = 0xFFFFFFFF
+
+CHUNK_SIZE = 1 << 16
+
+
+class GrowingFile(io.RawIOBase):
+    """
+    Read a file that is still being written to, e.g. by `curl` or `wget`.
+
+    Reads block until data is available. If the file does not grow for `timeout`
+    seconds, the download is assumed to have stalled.
+    """
+
+    def __init__(self, path, timeout=60.0, poll_interval=0.5):
+        self.f = open(path, "rb")
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+    def readable(self):
+        return True
+
+    def read(self, n=-1):
+        waited = 0.0
+        while True:
+            data = self.f.read(n)
+            if data or n == 0:
+                return data
+            if waited >= self.timeout:
+                raise Exception(
+                    f"{self.f.name}: No new data for {self.timeout} seconds, giving up"
+                )
+            time.sleep(self.poll_interval)
+            waited += self.poll_interval
+
+    def close(self):
+        self.f.close()
+        super().close()
+
+
+class _Stream:
+    def __init__(self, f):
+        self.f = f
+        self.pushback = b""
+        self.position = 0
+
+    def read_some(self, n) -> bytes:
+        if self.pushback:
+            data, self.pushback = self.pushback[:n], self.pushback[n:]
+        else:
+            data = self.f.read(n)
+        self.position += len(data)
+        return data
+
+    def read_exact(self, n) -> bytes:
+        parts = []
+        remaining = n
+        while remaining > 0:
+            data = self.read_some(remaining)
+            if not data:
+                raise Exception(
+                    f"Unexpected end of archive at offset {self.position}, wanted {remaining} more bytes"
+                )
+            parts.append(data)
+            remaining -= len(data)
+        return b"".join(parts)
+
+    def unread(self, data):
+        self.pushback = data + self.pushback
+        self.position -= len(data)
+
+
+class _MemberReader(io.RawIOBase):
+    def __init__(self, stream: _Stream, info: zipfile.ZipInfo, zip64: bool):
+        self.stream = stream
+        self.info = info
+        self.zip64 = zip64
+        self.has_data_descriptor = bool(info.flag_bits & FLAG_DATA_DESCRIPTOR)
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        elif info.compress_type == zipfile.ZIP_STORED:
+            if self.has_data_descriptor:
+                raise Exception(
+                    f"{info.filename}: Cannot stream a stored member with a data descriptor"
+                )
+            self.decompressor = None
+        else:
+            raise Exception(
+                f"{info.filename}: Unsupported compression method {info.compress_type}"
+            )
+        self.compressed_remaining = (
+            None if self.has_data_descriptor else info.compress_size
+        )
+        self.compressed_read = 0
+        # Inflated data not yet returned by `read` starts at `offset` in `buffer`.
+        self.buffer = b""
+        self.offset = 0
+        self.crc = 0
+        self.size = 0
+        self.eof = False
+
+    def readable(self):
+        return True
+
+    def _next_chunk(self) -> bytes:
+        if self.compressed_remaining is None:
+            chunk = self.stream.read_some(CHUNK_SIZE)
+            if not chunk:
+                raise Exception(f"{self.info.filename}: Unexpected end of archive")
+        elif self.compressed_remaining > 0:
+            chunk = self.stream.read_some(min(CHUNK_SIZE, self.compressed_remaining))
+            if not chunk:
+                raise Exception(f"{self.info.filename}: Unexpected end of archive")
+            self.compressed_remaining -= len(chunk)
+        else:
+            chunk = b""
+        self.compressed_read += len(chunk)
+        return chunk
+
+    def _inflate(self, n) -> bytes:
+        """
+        Inflate at most `max(n, CHUNK_SIZE)` bytes, like `zipfile.ZipExtFile`, so
+        that a highly compressed chunk does not have to be inflated at once.
+        """
+        if self.decompressor is None:
+            data = self._next_chunk()
+            if self.compressed_remaining == 0:
+                self._finish(data)
+            else:
+                self._update(data)
+            return data
+
+        # Input that did not fit into the last call is continued first.
+        chunk = self.decompressor.unconsumed_tail or self._next_chunk()
+        data = self.decompressor.decompress(chunk, max(n, CHUNK_SIZE))
+        if self.decompressor.eof:
+            unused = self.decompressor.unused_data
+            if unused:
+                self.stream.unread(unused)
+                self.compressed_read -= len(unused)
+            self._finish(data)
+        elif not chunk and not data:
+            raise Exception(f"{self.info.filename}: Truncated deflate stream")
+        else:
+            self._update(data)
+        return data
+
+    def _update(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+
+    def _finish(self, data=b""):
+        self._update(data)
+        self.eof = True
+        if self.has_data_descriptor:
+            self._read_data_descriptor()
+        info = self.info
+        if self.compressed_read != info.compress_size:
+            raise Exception(
+                f"{info.filename}: Expected {info.compress_size} compressed bytes, got {self.compressed_read}"
+            )
+        if self.size != info.file_size:
+            raise Exception(
+                f"{info.filename}: Expected {info.file_size} bytes, got {self.size}"
+            )
+        if self.crc != info.CRC:
+            raise Exception(
+                f"{info.filename}: CRC mismatch, expected {info.CRC:08x}, got {self.crc:08x}"
+            )
+
+    def _read_data_descriptor(self):
+        signature = self.stream.read_exact(4)
+        if signature == DATA_DESCRIPTOR:
+            crc = struct.unpack("<I", self.stream.read_exact(4))[0]
+        else:
+            crc = struct.unpack("<I", signature)[0]
+        if self.zip64:
+            compress_size, file_size = struct.unpack("<QQ", self.stream.read_exact(16))
+        else:
+            compress_size, file_size = struct.unpack("<II", self.stream.read_exact(8))
+        self.info.CRC = crc
+        self.info.compress_size = compress_size
+        self.info.file_size = file_size
+
+    def read(self, n=-1):
+        if n < 0:
+            parts = [self.buffer[self.offset :]]
+            while not self.eof:
+                parts.append(self._inflate(CHUNK_SIZE))
+            self.buffer, self.offset = b"", 0
+            return b"".join(parts)
+
+        while not self.eof and len(self.buffer) - self.offset < n:
+            data = self._inflate(n)
+            if self.offset == len(self.buffer):
+                self.buffer = data
+            else:
+                self.buffer = self.buffer[self.offset :] + data
+            self.offset = 0
+        data = self.buffer[self.offset : self.offset + n]
+        self.offset += len(data)
+        return data
+
+    def drain(self):
+        while not self.eof:
+            self._inflate(CHUNK_SIZE)
+        self.buffer, self.offset = b"", 0
+
+
+def _zip64_sizes(extra: bytes, file_size, compress_size):
+    # The ZIP64 extra field only contains the values that overflowed, in this order.
+    while len(extra) >= 4:
+        tag, length = struct.unpack("<HH", extra[:4])
+        if tag == ZIP64_EXTRA:
+            data = extra[4 : 4 + length]
+            if file_size == ZIP64_LIMIT:
+                (file_size,) = struct.unpack("<Q", data[:8])
+                data = data[8:]
+            if compress_size == ZIP64_LIMIT:
+                (compress_size,) = struct.unpack("<Q", data[:8])
+            return file_size, compress_size, True
+        extra = extra[4 + length :]
+    return file_size, compress_size, False
+
+
+def _read_local_file_header(stream: _Stream) -> tuple[zipfile.ZipInfo, bool]:
+    (
+        _version,
+        flag_bits,
+        compress_type,
+        mtime,
+        mdate,
+        crc,
+        compress_size,
+        file_size,
+        name_length,
+        extra_length,
+    ) = LOCAL_FILE_HEADER_STRUCT.unpack(
+        stream.read_exact(LOCAL_FILE_HEADER_STRUCT.size)
+    )
+    name = stream.read_exact(name_length)
+    extra = stream.read_exact(extra_length)
+
+    filename = name.decode("utf-8" if flag_bits & 0x800 else "cp437")
+    date_time = (
+        (mdate >> 9) + 1980,
+        (mdate >> 5) & 0xF,
+        mdate & 0x1F,
+        mtime >> 11,
+        (mtime >> 5) & 0x3F,
+        (mtime & 0x1F) * 2,
+    )
+    info = zipfile.ZipInfo(filename, date_time)
+    info.flag_bits = flag_bits
+    info.compress_type = compress_type
+    info.CRC = crc
+    file_size, compress_size, zip64 = _zip64_sizes(extra, file_size, compress_size)
+    info.compress_size = compress_size
+    info.file_size = file_size
+    return info, zip64
+
+
+def _check_central_directory(
+    stream: _Stream, members: list[zipfile.ZipInfo], signature: bytes
+):
+    central: list[tuple[str, int, int, int]] = []
+    while signature == CENTRAL_DIRECTORY_HEADER:
+        fields = CENTRAL_DIRECTORY_HEADER_STRUCT.unpack(
+            stream.read_exact(CENTRAL_DIRECTORY_HEADER_STRUCT.size)
+        )
+        flag_bits = fields[2]
+        crc, compress_size, file_size = fields[6], fields[7], fields[8]
+        name_length, extra_length, comment_length = fields[9], fields[10], fields[11]
+        name = stream.read_exact(name_length)
+        extra = stream.read_exact(extra_length)
+        stream.read_exact(comment_length)
+        file_size, compress_size, _ = _zip64_sizes(extra, file_size, compress_size)
+        filename = name.decode("utf-8" if flag_bits & 0x800 else "cp437")
+        central.append((filename, crc, compress_size, file_size))
+        signature = stream.read_exact(4)
+
+    expected_entries = None
+    if signature == ZIP64_END_OF_CENTRAL_DIRECTORY:
+        fields = ZIP64_END_OF_CENTRAL_DIRECTORY_STRUCT.unpack(
+            stream.read_exact(ZIP64_END_OF_CENTRAL_DIRECTORY_STRUCT.size)
+        )
+        # Skip the extensible data sector.
+        stream.read_exact(fields[0] - (ZIP64_END_OF_CENTRAL_DIRECTORY_STRUCT.size - 8))
+        expected_entries = fields[6]
+        signature = stream.read_exact(4)
+    if signature == ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR:
+        stream.read_exact(ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR_STRUCT.size)
+        signature = stream.read_exact(4)
+    if signature != END_OF_CENTRAL_DIRECTORY:
+        raise Exception(
+            f"Expected end of central directory at offset {stream.position - 4}, got {signature!r}"
+        )
+    fields = END_OF_CENTRAL_DIRECTORY_STRUCT.unpack(
+        stream.read_exact(END_OF_CENTRAL_DIRECTORY_STRUCT.size)
+    )
+    if expected_entries is None:
+        expected_entries = fields[3]
+
+    if len(central) != expected_entries:
+        raise Exception(
+            f"Central directory lists {len(central)} entries, end record says {expected_entries}"
+        )
+    seen = [(i.filename, i.CRC, i.compress_size, i.file_size) for i in members]
+    if central != seen:
+        missing = set(central) - set(seen)
+        unexpected = set(seen) - set(central)
+        raise Exception(
+            f"Central directory does not match local file headers: missing {sorted(missing)}, unexpected {sorted(unexpected)}"
+        )
+
+
+def iter_members(f) -> Iterator[tuple[zipfile.ZipInfo, io.RawIOBase]]:
+    """
+    Read the members of a ZIP archive in the order in which they are stored.
+
+    Unlike `zipfile.ZipFile`, this does not need a seekable file: each member is
+    yielded as soon as its local file header has been read, and its data is
+    inflated while it is read. The caller must be done with a member before it
+    advances the iterator. The central directory is only checked once all
+    members have been read.
+    """
+    stream = _Stream(f)
+    members: list[zipfile.ZipInfo] = []
+    while True:
+        signature = stream.read_exact(4)
+        if signature != LOCAL_FILE_HEADER:
+            break
+        info, zip64 = _read_local_file_header(stream)
+        reader = _MemberReader(stream, info, zip64)
+        yield info, reader
+        reader.drain()
+        members.append(info)
+
+    # An empty archive only has the end of central directory record.
+    if signature not in (
+        CENTRAL_DIRECTORY_HEADER,
+        ZIP64_END_OF_CENTRAL_DIRECTORY,
+        END_OF_CENTRAL_DIRECTORY,
+    ):
+        raise Exception(
+            f"Expected local file header or central directory at offset {stream.position - 4}, got {signature!r}"
+        )
+    _check_central_directory(stream, members, signature)
+
+
+def open_export(export, timeout: Optional[float] = None):
+    """
+    Open `export` for streaming: either an HTTP(S) URL or a path to a file that may
+    still be growing.
+    """
+    from . import download
+
+    if export.startswith("http://") or export.startswith("https://"):
+        return download.open_url(export)
+    if not os.path.exists(export):
+        raise Exception(f"{export}: No such file")
+    return GrowingFile(export) if timeout is None else GrowingFile(export, timeout)
@@ -0,0 +1,111 @@
+import importlib.resources
+import io
+import os
+
+import polars as pl
+import pytest
+
+from mastr_export import decoder, spec_data
+from mastr_export.parser import Parser
+from mastr_export.spec import Specs
+
+SPECS = Specs.load(importlib.resources.files(spec_data) / "Gesamtdatenexport.yaml")
+SPEC = SPECS.for_file("EinheitenSolar")
+
+
+def _units(*units):
+    return "<EinheitenSolar>{}</EinheitenSolar>".format(
+        "".join(f"<EinheitSolar>{u}</EinheitSolar>" for u in units)
+    )
+
+
+DOCUMENTS = [
+    # Structure
+    "<X/>",
+    "<EinheitenSolar><Foo/></EinheitenSolar>",
+    _units("<Bogus/>"),
+    _units("x"),
+    "<EinheitenSolar>x</EinheitenSolar>",
+    _units("<Land>1<Ort/></Land>"),
+    _units(""),
+    _units("<Ort>a&amp;b</Ort>"),
+    # Repeated fields
+    _units("<Land>1</Land><Ort>a</Ort><Ort>b</Ort>"),
+    _units("<Land>1</Land><Land>2</Land>"),
+    _units("<Land></Land><Land>5</Land>"),
+    _units("<Land>4</Land><Land></Land>"),
+    _units("<Ort></Ort><Ort>b</Ort><Ort>c</Ort>"),
+    # Values
+    _units("<Land>x</Land>"),
+    _units("<Land>99999</Land>"),
+    _units("<Land>1_0</Land><Laengengrad> 1.5 </Laengengrad>", "<Land>+3</Land>"),
+    _units("<Laengengrad>nan</Laengengrad>"),
+    _units(
+        "<Land></Land><Ort></Ort><Laengengrad>1.5</Laengengrad>"
+        "<DatumLetzteAktualisierung>2020-01-01T00:00:00+02:00</DatumLetzteAktualisierung>",
+        "",
+    ),
+    _units("<Inbetriebnahmedatum>2020-01-01</Inbetriebnahmedatum>"),
+    _units("<Inbetriebnahmedatum>2020-1-01</Inbetriebnahmedatum>"),
+    _units("<Inbetriebnahmedatum>2020-02-30</Inbetriebnahmedatum>"),
+    _units(
+        "<DatumLetzteAktualisierung>2020-01-01T01:02:03.1234567</DatumLetzteAktualisierung>",
+        "<DatumLetzteAktualisierung>2020-01-01 01:02</DatumLetzteAktualisierung>",
+    ),
+    _units(
+        "<DatumLetzteAktualisierung>2016-12-31T23:59:59.5</DatumLetzteAktualisierung>"
+    ),
+    # A leap second, which `datetime` rejects.
+    _units(
+        "<DatumLetzteAktualisierung>2016-12-31T23:59:60</DatumLetzteAktualisierung>"
+    ),
+    _units(
+        "<DatumLetzteAktualisierung>2016-12-31T24:00:00</DatumLetzteAktualisierung>"
+    ),
+]
+
+
+def _parse(parse, doc):
+    try:
+        df = pl.DataFrame(
+            parse(io.BytesIO(doc.encode()), "F"), schema=SPEC.polars_schema()
+        )
+    except Exception as e:
+        return type(e), str(e)
+    return df
+
+
+@pytest.fixture
+def decode(tmp_path):
+    return decoder.for_spec(SPEC, str(tmp_path))
+
+
+@pytest.mark.parametrize("doc", DOCUMENTS)
+def test_same_as_parser(decode, doc):
+    expected = _parse(Parser(SPEC).parse, doc)
+    actual = _parse(decode, doc)
+    if isinstance(expected, pl.DataFrame):
+        assert isinstance(actual, pl.DataFrame), actual
+        # `equals` treats NaN like any other value.
+        assert actual.equals(expected)
+    else:
+        assert actual == expected
+
+
+def test_errors_name_the_field(decode):
+    error_type, message = _parse(decode, _units("<Land>99999</Land>"))
+    assert error_type is TypeError
+    assert "while constructing Series 'Land'" in message
+
+
+def test_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(decoder, "_decoders", {})
+    decoder.for_spec(SPEC, str(tmp_path))
+    (cached,) = os.listdir(tmp_path)
+    assert cached.endswith(".py")
+    monkeypatch.setattr(decoder, "_decoders", {})
+    # The cached source is used as it is.
+    with open(tmp_path / cached, "a") as f:
+        f.write("\nMARKER = True\n")
+    decode = decoder.for_spec(SPEC, str(tmp_path))
+    assert decode.__globals__["MARKER"]
@@ -0,0 +1,122 @@
+import os
+
+import duckdb
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import pytest
+
+from mastr_export import duckdb_export
+
+ROWS = 300_001
+
+
+@pytest.fixture
+def con(tmp_path):
+    con = duckdb.connect(str(tmp_path / "export.duckdb"))
+    con.sql(
+        f"create table Einheit as select range as Id, 'Einheit ' || range as Name from range({ROWS})"
+    )
+    con.sql("create table Leer (Id integer)")
+    yield con
+    con.close()
+
+
+def _export(con, tmp_path, fmt, table="Einheit", **options):
+    directory = tmp_path / fmt
+    directory.mkdir(exist_ok=True)
+    return duckdb_export.export_table(
+        con, table, str(directory), fmt, duckdb_export.Options(**options)
+    )
+
+
+def _rows(path, fmt):
+    if fmt == "parquet":
+        return pq.ParquetFile(path).metadata.num_rows
+    return pacsv.read_csv(path).num_rows
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "csv"])
+def test_max_rows_per_file(con, tmp_path, fmt):
+    stats = _export(con, tmp_path, fmt, max_rows_per_file=100_000)
+    assert stats.rows == ROWS
+    assert [os.path.basename(f) for f in stats.files] == [
+        f"Einheit_{part:05d}.{fmt}" for part in range(4)
+    ]
+    assert [_rows(f, fmt) for f in stats.files] == [100_000] * 3 + [1]
+    assert stats.size == sum(os.path.getsize(f) for f in stats.files)
+
+
+def test_row_group_size(con, tmp_path):
+    stats = _export(con, tmp_path, "parquet", row_group_size=150_000)
+    assert stats.files == [str(tmp_path / "parquet" / "Einheit.parquet")]
+    metadata = pq.ParquetFile(stats.files[0]).metadata
+    assert [metadata.row_group(k).num_rows for k in range(metadata.num_row_groups)] == [
+        150_000,
+        150_000,
+        1,
+    ]
+
+
+def test_row_groups_do_not_span_files(con, tmp_path):
+    stats = _export(
+        con, tmp_path, "parquet", row_group_size=40_000, max_rows_per_file=100_000
+    )
+    groups = []
+    for f in stats.files:
+        metadata = pq.ParquetFile(f).metadata
+        groups.append(
+            [metadata.row_group(k).num_rows for k in range(metadata.num_row_groups)]
+        )
+    assert groups == [[40_000, 40_000, 20_000]] * 3 + [[1]]
+
+
+@pytest.mark.parametrize(
+    "fmt, options",
+    [
+        ("parquet", {"row_group_size": 20_000}),
+        ("csv", {}),
+        ("csv", {"compression": "gzip"}),
+    ],
+)
+def test_max_file_size(con, tmp_path, fmt, options):
+    max_file_size = 512 * 1024
+    stats = _export(con, tmp_path, fmt, max_file_size=max_file_size, **options)
+    assert stats.rows == ROWS
+    assert len(stats.files) > 1
+    assert sum(_rows(f, fmt) for f in stats.files) == ROWS
+    sizes = [os.path.getsize(f) for f in stats.files]
+    # Files are closed at the first chunk boundary past the limit.
+    assert all(size >= max_file_size for size in sizes[:-1])
+    assert all(size < 2 * max_file_size for size in sizes)
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "csv"])
+def test_empty_table(con, tmp_path, fmt):
+    stats = _export(con, tmp_path, fmt, table="Leer", max_rows_per_file=10)
+    assert stats.rows == 0
+    assert [os.path.basename(f) for f in stats.files] == [f"Leer_00000.{fmt}"]
+    assert _rows(stats.files[0], fmt) == 0
+
+
+def test_failure_leaves_no_temporary_file(con, tmp_path, monkeypatch):
+    flush = duckdb_export._Writer.flush
+    calls = []
+
+    def failing_flush(self):
+        calls.append(self.path)
+        if len(calls) == 3:
+            raise RuntimeError("disk full")
+        flush(self)
+
+    monkeypatch.setattr(duckdb_export._Writer, "flush", failing_flush)
+    with pytest.raises(RuntimeError, match="disk full"):
+        _export(con, tmp_path, "parquet", max_rows_per_file=100_000)
+    assert not any(f.endswith(".tmp") for f in os.listdir(tmp_path / "parquet"))
+
+
+@pytest.mark.parametrize(
+    "option", ["max_rows_per_file", "max_file_size", "row_group_size"]
+)
+def test_options_reject_non_positive_limits(option):
+    with pytest.raises(ValueError, match=option):
+        duckdb_export.Options(**{option: 0})
@@ -0,0 +1,155 @@
+import concurrent.futures
+import json
+import os
+import zipfile
+
+import polars as pl
+import pytest
+
+from mastr_export import schedule
+from mastr_export.spec import Spec
+
+SPEC = Spec(
+    root="Katalogwerte",
+    element="Katalogwert",
+    fields=[{"name": "Id", "xsd": "int"}, {"name": "Wert"}],
+    primary="Id",
+)
+
+# Rows per member: the first and third are large, the others are grouped.
+ROWS = [300, 50, 200, 30, 40]
+ROW = "<Katalogwert><Id>{}</Id><Wert>x</Wert></Katalogwert>"
+
+
+def _infos(sizes) -> list[tuple[zipfile.ZipInfo, Spec]]:
+    xml_files = []
+    for n, size in enumerate(sizes):
+        i = zipfile.ZipInfo(f"Katalogwerte_{n}.xml")
+        i.file_size = size
+        xml_files.append((i, SPEC))
+    return xml_files
+
+
+def _throughput():
+    # One byte per second, so that costs are sizes.
+    throughput = schedule.Throughput()
+    throughput.history[SPEC.element] = 1.0
+    return throughput
+
+
+def _members(tasks):
+    return [[n for n, _, _ in task.members] for task in tasks]
+
+
+def test_plan_tasks():
+    tasks = schedule.plan_tasks(_infos(ROWS), _throughput(), small_task_size=100)
+    assert _members(tasks) == [[0], [2], [1, 3, 4]]
+    assert [task.predicted for task in tasks] == [300.0, 200.0, 120.0]
+
+
+@pytest.mark.parametrize(
+    "jobs, lookahead, expected",
+    [
+        (1, schedule.LOOKAHEAD, 620.0),
+        # The next member's task first, then the largest.
+        (2, schedule.LOOKAHEAD, 320.0),
+        # The second large member waits until it is within reach.
+        (2, 250, 500.0),
+        # Only the task holding the next member runs.
+        (2, 0, 620.0),
+    ],
+)
+def test_predict_wall_time(jobs, lookahead, expected):
+    xml_files = _infos(ROWS)
+    tasks = schedule.plan_tasks(xml_files, _throughput(), small_task_size=100)
+    assert schedule.predict_wall_time(tasks, xml_files, jobs, lookahead) == expected
+
+
+def test_throughput_history(tmp_path):
+    history_file = str(tmp_path / "history.json")
+    throughput = schedule.Throughput(history_file)
+    throughput.update({"Katalogwert": 100.0})
+    throughput.save()
+    throughput = schedule.Throughput(history_file)
+    throughput.update({"Katalogwert": 200.0, "EinheitSolar": 10.0})
+    throughput.save()
+    with open(history_file) as f:
+        assert json.load(f) == {"Katalogwert": 150.0, "EinheitSolar": 10.0}
+    assert os.listdir(tmp_path) == ["history.json"]
+    assert schedule.Throughput(history_file).estimate(SPEC, 300) == 2.0
+
+
+@pytest.fixture
+def export(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    path = tmp_path / "export.zip"
+    ids = iter(range(sum(ROWS)))
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        for n, rows in enumerate(ROWS):
+            body = "".join(ROW.format(next(ids)) for _ in range(rows))
+            z.writestr(f"Katalogwerte_{n}.xml", f"<Katalogwerte>{body}</Katalogwerte>")
+    with zipfile.ZipFile(path) as z:
+        xml_files = [(i, SPEC) for i in z.infolist()]
+    return str(path), xml_files
+
+
+class _Progress:
+    def update(self, n):
+        pass
+
+
+def _execute(export, xml_files, jobs, lookahead):
+    report = schedule.Report(jobs, None)
+    results = list(
+        schedule.execute(
+            export,
+            xml_files,
+            jobs,
+            schedule.Throughput(),
+            report,
+            _Progress(),
+            lookahead=lookahead,
+            small_task_size=100 * len(ROW),
+        )
+    )
+    assert [i.filename for i, _, _ in results] == [i.filename for i, _ in xml_files]
+    df = pl.concat([df for _, _, df in results])
+    assert df["Id"].to_list() == list(range(sum(ROWS)))
+    assert report.specs[SPEC.element]["files"] == len(ROWS)
+    return report
+
+
+@pytest.mark.parametrize(
+    "lookahead, expected",
+    [
+        (schedule.LOOKAHEAD, [[0], [2], [1, 3, 4]]),
+        (0, [[0], [1, 3, 4], [2]]),
+    ],
+)
+def test_execute_order(export, monkeypatch, lookahead, expected):
+    submitted = []
+
+    class InProcess:
+        def __init__(self, max_workers, mp_context):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def submit(self, fn, *args):
+            submitted.append([n for n, _, _ in args[1]])
+            future = concurrent.futures.Future()
+            future.set_result(fn(*args))
+            return future
+
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", InProcess)
+    _execute(*export, jobs=2, lookahead=lookahead)
+    assert submitted == expected
+
+
+def test_execute_in_processes(export):
+    report = _execute(*export, jobs=2, lookahead=schedule.LOOKAHEAD)
+    assert report.predicted_wall_time is not None
@@ -0,0 +1,171 @@
+import argparse
+import os
+import zipfile
+
+import polars as pl
+import pytest
+
+from mastr_export import shard
+from mastr_export.spec import Spec, Specs
+
+KATALOGWERT = Spec(
+    root="Katalogwerte",
+    element="Katalogwert",
+    fields=[{"name": "Id", "xsd": "int"}, {"name": "Wert"}],
+    primary="Id",
+)
+EINHEIT = Spec(
+    root="EinheitenSolar",
+    element="EinheitSolar",
+    fields=[{"name": "EinheitMastrNummer"}],
+    primary="EinheitMastrNummer",
+)
+SPECS = Specs([KATALOGWERT, EINHEIT])
+
+
+@pytest.fixture
+def export(tmp_path):
+    path = tmp_path / "Gesamtdatenexport.zip"
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        # Not in load order: the units must follow the specs.
+        z.writestr("EinheitenSolar_2.xml", b"<EinheitenSolar/>" * 3000)
+        z.writestr("Katalogwerte.xml", b"<Katalogwerte/>")
+        z.writestr("EinheitenSolar_1.xml", b"<EinheitenSolar/>" * 1000)
+    return str(path)
+
+
+def test_plan(export):
+    manifest = shard.plan(SPECS, export)
+    assert manifest["export"] == "Gesamtdatenexport.zip"
+    assert manifest["export_size"] == os.path.getsize(export)
+    assert [(u["unit"], u["member"], u["table"]) for u in manifest["units"]] == [
+        (0, "Katalogwerte.xml", "Katalogwert"),
+        (1, "EinheitenSolar_2.xml", "EinheitSolar"),
+        (2, "EinheitenSolar_1.xml", "EinheitSolar"),
+    ]
+
+
+def test_plan_rejects_other_files(tmp_path):
+    path = tmp_path / "export.zip"
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("Katalogwerte.xsd", b"")
+    with pytest.raises(Exception, match="Expected only XML files"):
+        shard.plan(SPECS, str(path))
+
+
+@pytest.mark.parametrize("s", ["1", "a/2", "1/-2", "2/2", "0/0"])
+def test_parse_shard_rejects(s):
+    with pytest.raises(argparse.ArgumentTypeError):
+        shard.parse_shard(s)
+
+
+def test_parse_shard():
+    assert shard.parse_shard("1/3") == (1, 3)
+
+
+def _units(sizes):
+    return [
+        {"unit": n, "member": f"EinheitenSolar_{n}.xml", "file_size": size}
+        for n, size in enumerate(sizes)
+    ]
+
+
+def test_assign():
+    units = _units([10, 50, 20, 20, 30, 10])
+    shards = shard.assign(units, 3)
+    # Every unit ends up in exactly one shard, in manifest order.
+    assert sorted(u["unit"] for s in shards for u in s) == list(range(len(units)))
+    for s in shards:
+        assert [u["unit"] for u in s] == sorted(u["unit"] for u in s)
+    assert [sum(u["file_size"] for u in s) for s in shards] == [50, 50, 40]
+    # Every node computes the same assignment, whatever order it reads units in.
+    assert shard.assign(list(reversed(units)), 3) == shards
+
+
+def test_assign_more_shards_than_units():
+    shards = shard.assign(_units([10]), 3)
+    assert [len(s) for s in shards] == [1, 0, 0]
+
+
+def _extract(export, manifest, directory, index, count):
+    """
+    What `extract --shard` writes, without parsing: one unit per member.
+    """
+    units = shard.assign(manifest["units"], count)[index]
+    target = shard.ShardTarget(
+        shard.shard_dir(directory, index, count),
+        units,
+        shard.identity(manifest, index, count),
+    )
+    target.open(SPECS)
+    for unit in units:
+        spec = KATALOGWERT if unit["table"] == "Katalogwert" else EINHEIT
+        df = pl.DataFrame({f: [unit["member"]] for f in spec.fields})
+        target.write(unit["member"], spec, df)
+    target.close()
+
+
+def _read(manifest, directory):
+    return [
+        (member, spec.element, df.row(0)[0])
+        for member, spec, df in shard.read_shards(SPECS, manifest, directory)
+    ]
+
+
+def test_read_shards(export, tmp_path):
+    manifest = shard.plan(SPECS, export)
+    out = str(tmp_path / "shards")
+    for index in range(2):
+        _extract(export, manifest, out, index, 2)
+    assert _read(manifest, out) == [
+        (u["member"], u["table"], u["member"]) for u in manifest["units"]
+    ]
+
+
+def test_read_shards_missing_unit(export, tmp_path):
+    manifest = shard.plan(SPECS, export)
+    out = str(tmp_path / "shards")
+    _extract(export, manifest, out, 0, 2)
+    with pytest.raises(Exception, match="not been extracted by any shard"):
+        _read(manifest, out)
+
+
+def test_read_shards_duplicate_unit(export, tmp_path):
+    manifest = shard.plan(SPECS, export)
+    out = str(tmp_path / "shards")
+    for index in range(2):
+        _extract(export, manifest, out, index, 2)
+    # A leftover of a run with a different shard count.
+    _extract(export, manifest, out, 0, 1)
+    with pytest.raises(Exception, match="extracted by several shards"):
+        _read(manifest, out)
+
+
+def test_read_shards_stale_manifest(export, tmp_path):
+    manifest = shard.plan(SPECS, export)
+    out = str(tmp_path / "shards")
+    for index in range(2):
+        _extract(export, manifest, out, index, 2)
+    newer = dict(manifest, export_size=manifest["export_size"] + 1)
+    with pytest.raises(Exception, match="different manifest"):
+        _read(newer, out)
+
+
+def test_read_shards_missing_identity(export, tmp_path):
+    manifest = shard.plan(SPECS, export)
+    out = str(tmp_path / "shards")
+    _extract(export, manifest, out, 0, 1)
+    os.remove(os.path.join(shard.shard_dir(out, 0, 1), shard.IDENTITY_FILE))
+    with pytest.raises(Exception, match="Missing shard.json"):
+        _read(manifest, out)
+
+
+def test_shard_target_refuses_a_different_shard(export, tmp_path):
+    manifest = shard.plan(SPECS, export)
+    out = str(tmp_path / "shards")
+    _extract(export, manifest, out, 0, 2)
+    target = shard.ShardTarget(
+        shard.shard_dir(out, 0, 2), [], shard.identity(manifest, 0, 3)
+    )
+    with pytest.raises(Exception, match="different manifest or shard"):
+        target.open(SPECS)
@@ -0,0 +1,144 @@
+import argparse
+import os
+
+import polars as pl
+import pytest
+
+from mastr_export import targets
+from mastr_export.spec import Spec, Specs
+
+SPEC = Spec(
+    root="Katalogwerte",
+    element="Katalogwert",
+    fields=[{"name": "Id", "xsd": "int"}, {"name": "Wert"}],
+    primary="Id",
+)
+SPECS = Specs([SPEC])
+
+
+def _batch(filename, ids, values):
+    df = pl.DataFrame({"Id": ids, "Wert": values}, schema=SPEC.polars_schema())
+    return filename, SPEC, df
+
+
+BATCHES = [
+    _batch("Katalogwerte_1.xml", [1, 2, 2], ["a", "b", "b2"]),
+    _batch("Katalogwerte_2.xml", [2, 3], ["b3", "c"]),
+    _batch("Katalogwerte_3.xml", [4], ["d"]),
+]
+
+
+class _Recorder(targets.Target):
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.events: list[str] = []
+
+    def open(self, specs):
+        self.events.append("open")
+
+    def write(self, filename, spec, df):
+        if filename == self.fail_on:
+            raise RuntimeError(f"cannot write {filename}")
+        self.events.append(filename)
+
+    def write_table(self, name, df):
+        if name == self.fail_on:
+            raise RuntimeError(f"cannot write {name}")
+        self.events.append(name)
+
+    def write_census(self, census):
+        self.events.append("census")
+
+    def close(self):
+        self.events.append("close")
+
+    def abort(self):
+        self.events.append("abort")
+
+
+def test_fan_out_commits():
+    a, b = _Recorder(), _Recorder()
+    targets.fan_out(
+        [a, b],
+        SPECS,
+        BATCHES,
+        census="census.parquet",
+        buffer_size=1,
+        tables=lambda: {"_column_stats": pl.DataFrame()},
+    )
+    expected = ["open"] + [f for f, _, _ in BATCHES]
+    expected += ["_column_stats", "census", "close"]
+    assert a.events == expected
+    assert b.events == expected
+
+
+@pytest.mark.parametrize("fail_on", ["Katalogwerte_3.xml", "_column_stats"])
+def test_fan_out_aborts_all_targets_if_one_fails_late(fail_on):
+    ok, failing = _Recorder(), _Recorder(fail_on=fail_on)
+    # The producer is done long before the failing target gets to the end.
+    with pytest.raises(RuntimeError, match="cannot write"):
+        targets.fan_out(
+            [ok, failing],
+            SPECS,
+            BATCHES,
+            census="census.parquet",
+            buffer_size=len(BATCHES) + 1,
+            tables=lambda: {"_column_stats": pl.DataFrame()},
+        )
+    assert ok.events[-1] == "abort"
+    assert "close" not in ok.events
+    assert failing.events[-1] == "abort"
+    assert "census" not in failing.events
+
+
+def test_fan_out_aborts_all_targets_if_the_producer_fails():
+    def batches():
+        yield BATCHES[0]
+        raise ValueError("corrupt export")
+
+    a, b = _Recorder(), _Recorder()
+    with pytest.raises(ValueError, match="corrupt export"):
+        targets.fan_out([a, b], SPECS, batches(), census="census.parquet")
+    for t in (a, b):
+        assert t.events == ["open", BATCHES[0][0], "abort"]
+
+
+def test_fan_out_rejects_an_unbounded_buffer():
+    with pytest.raises(ValueError):
+        targets.fan_out([_Recorder()], SPECS, BATCHES, buffer_size=0)
+
+
+@pytest.mark.parametrize("kind", [targets.ParquetTarget, targets.CSVTarget])
+def test_file_target_drops_duplicate_keys(tmp_path, kind):
+    target = kind(str(tmp_path))
+    targets.fan_out([target], SPECS, BATCHES)
+    path = target.path(SPEC.element)
+    if kind is targets.ParquetTarget:
+        df = pl.read_parquet(path)
+    else:
+        df = pl.read_csv(path, schema=SPEC.polars_schema())
+    assert df.rows() == [(1, "a"), (2, "b"), (3, "c"), (4, "d")]
+
+
+def test_file_target_removes_its_files_on_abort(tmp_path):
+    (tmp_path / "unrelated.parquet").write_bytes(b"")
+
+    def batches():
+        yield from BATCHES
+        raise ValueError("corrupt export")
+
+    with pytest.raises(ValueError):
+        targets.fan_out([targets.ParquetTarget(str(tmp_path))], SPECS, batches())
+    assert os.listdir(tmp_path) == ["unrelated.parquet"]
+
+
+@pytest.mark.parametrize("s", ["foo:bar", "duckdb", "duckdb:"])
+def test_parse_target_rejects(s):
+    with pytest.raises(argparse.ArgumentTypeError, match="Expected KIND:PATH"):
+        targets.parse_target(s)
+
+
+def test_parse_target():
+    target = targets.parse_target("parquet:out/dir")
+    assert isinstance(target, targets.ParquetTarget)
+    assert target.directory == "out/dir"
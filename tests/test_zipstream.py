@@ -0,0 +1,190 @@
+import io
+import os
+import struct
+import zipfile
+
+import pytest
+
+from mastr_export import zipstream
+
+MEMBERS = {
+    "Katalogwerte.xml": b"<Katalogwerte></Katalogwerte>" * 100,
+    "empty.xml": b"",
+    # Compresses far better than one chunk per `CHUNK_SIZE`.
+    "EinheitenSolar_1.xml": b"<EinheitSolar>0</EinheitSolar>" * 200_000,
+    "random.bin": os.urandom(3 * zipstream.CHUNK_SIZE + 17),
+}
+
+
+class _Unseekable(io.RawIOBase):
+    """
+    A write-only file without `tell` and `seek`, which makes `zipfile` write data
+    descriptors.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+
+def _archive(
+    compression=zipfile.ZIP_DEFLATED, data_descriptor=False, force_zip64=False
+) -> bytes:
+    f = _Unseekable() if data_descriptor else io.BytesIO()
+    with zipfile.ZipFile(f, "w", compression=compression) as z:
+        for name, data in MEMBERS.items():
+            with z.open(name, "w", force_zip64=force_zip64) as member:
+                member.write(data)
+    return bytes(f.data) if data_descriptor else f.getvalue()
+
+
+def _read_all(archive: bytes, size=2048) -> dict[str, bytes]:
+    result = {}
+    for info, f in zipstream.iter_members(io.BytesIO(archive)):
+        parts = []
+        while data := f.read(size):
+            parts.append(data)
+        result[info.filename] = b"".join(parts)
+    return result
+
+
+@pytest.mark.parametrize("compression", [zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED])
+def test_members(compression):
+    assert _read_all(_archive(compression)) == MEMBERS
+
+
+def test_read_sizes():
+    archive = _archive()
+    for size in (1, 4096, zipstream.CHUNK_SIZE + 1, 1 << 22):
+        members = dict(
+            (info.filename, f.read(size))
+            for info, f in zipstream.iter_members(io.BytesIO(archive))
+        )
+        assert members == dict(
+            (name, data[:size]) for name, data in MEMBERS.items()
+        ), size
+
+
+def test_read_everything():
+    members = dict(
+        (info.filename, f.read())
+        for info, f in zipstream.iter_members(io.BytesIO(_archive()))
+    )
+    assert members == MEMBERS
+
+
+def test_unread_members_are_skipped():
+    names = [
+        info.filename for info, _ in zipstream.iter_members(io.BytesIO(_archive()))
+    ]
+    assert names == list(MEMBERS)
+
+
+def test_data_descriptor():
+    archive = _archive(data_descriptor=True)
+    with zipfile.ZipFile(io.BytesIO(archive)) as z:
+        assert all(i.flag_bits & zipstream.FLAG_DATA_DESCRIPTOR for i in z.infolist())
+    assert _read_all(archive) == MEMBERS
+
+
+def test_stored_member_with_data_descriptor():
+    archive = _archive(zipfile.ZIP_STORED, data_descriptor=True)
+    with pytest.raises(Exception, match="Cannot stream a stored member"):
+        _read_all(archive)
+
+
+@pytest.mark.parametrize("data_descriptor", [False, True])
+def test_zip64(data_descriptor):
+    archive = _archive(data_descriptor=data_descriptor, force_zip64=True)
+    infos = [info for info, _ in zipstream.iter_members(io.BytesIO(archive))]
+    with zipfile.ZipFile(io.BytesIO(archive)) as z:
+        assert [(i.filename, i.file_size, i.compress_size, i.CRC) for i in infos] == [
+            (i.filename, i.file_size, i.compress_size, i.CRC) for i in z.infolist()
+        ]
+    assert _read_all(archive) == MEMBERS
+
+
+def test_zip64_end_of_central_directory():
+    archive = bytearray(_archive())
+    with zipfile.ZipFile(io.BytesIO(bytes(archive))) as z:
+        start = z.start_dir
+        entries = len(z.infolist())
+    end = archive.rindex(zipstream.END_OF_CENTRAL_DIRECTORY)
+    size = end - start
+    record = zipstream.ZIP64_END_OF_CENTRAL_DIRECTORY_STRUCT.pack(
+        zipstream.ZIP64_END_OF_CENTRAL_DIRECTORY_STRUCT.size - 8,
+        45,
+        45,
+        0,
+        0,
+        entries,
+        entries,
+        size,
+        start,
+    )
+    locator = zipstream.ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR_STRUCT.pack(0, end, 1)
+    archive[end:end] = (
+        zipstream.ZIP64_END_OF_CENTRAL_DIRECTORY
+        + record
+        + zipstream.ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR
+        + locator
+    )
+    assert _read_all(bytes(archive)) == MEMBERS
+
+
+def test_empty_archive():
+    f = io.BytesIO()
+    with zipfile.ZipFile(f, "w"):
+        pass
+    assert _read_all(f.getvalue()) == {}
+
+
+@pytest.mark.parametrize("data_descriptor", [False, True])
+def test_truncated(data_descriptor):
+    archive = _archive(data_descriptor=data_descriptor)
+    for length in (
+        0,
+        3,
+        20,
+        100,
+        len(archive) // 2,
+        len(archive) - 30,
+        len(archive) - 1,
+    ):
+        with pytest.raises(Exception):
+            _read_all(archive[:length])
+
+
+def test_corrupt_data():
+    archive = bytearray(_archive(zipfile.ZIP_STORED))
+    offset = archive.index(MEMBERS["Katalogwerte.xml"])
+    archive[offset] ^= 0xFF
+    with pytest.raises(Exception, match="CRC mismatch"):
+        _read_all(bytes(archive))
+
+
+def test_central_directory_mismatch():
+    archive = bytearray(_archive())
+    offset = archive.index(zipstream.CENTRAL_DIRECTORY_HEADER)
+    # CRC of the first central directory entry.
+    (crc,) = struct.unpack_from("<I", archive, offset + 16)
+    struct.pack_into("<I", archive, offset + 16, crc ^ 1)
+    members = zipstream.iter_members(io.BytesIO(bytes(archive)))
+    with pytest.raises(Exception, match="Central directory does not match"):
+        for _ in members:
+            pass
+
+
+def test_central_directory_entry_count_mismatch():
+    archive = bytearray(_archive())
+    offset = archive.rindex(zipstream.END_OF_CENTRAL_DIRECTORY)
+    # Total number of entries in the end of central directory record.
+    struct.pack_into("<H", archive, offset + 10, len(MEMBERS) + 1)
+    with pytest.raises(Exception, match="end record says"):
+        _read_all(bytes(archive))